@@ -1,12 +1,12 @@
+import hashlib
+import io
+import shutil
+import tempfile
+import weakref
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator, Tuple
 from utils.prompt_templates import PromptTemplates, format_prompt
 from utils.benchmarking import LLMBenchmark, quick_benchmark
-import sys
-
-# Add the parent directory to the path so we can import core modules
-sys.path.append(str(Path(__file__).parent.parent))
-
 from core.inference_engine import InferenceEngine
 
 
@@ -46,11 +46,27 @@ class LocalLLM:
             if not auto_selected:
                 raise RuntimeError("No models available. Check your configuration.")
 
+        self._refresh_model_flags()
+
         # Set up parameters
         self.engine.set_preset(preset)
         self.templates = PromptTemplates()
         self.benchmark = LLMBenchmark(self)
         self.allow_slow_models = allow_slow_models
+        # llama.cpp prompt cache files (CLI mode), one per conversation
+        self._prompt_cache_dir = Path(tempfile.mkdtemp(prefix="llm_wrapper_cache_"))
+        # Removed by close(), or at garbage collection / exit for scripts
+        # that never call it - the cache files can run to gigabytes
+        self._remove_prompt_cache = weakref.finalize(
+            self, shutil.rmtree, self._prompt_cache_dir, True
+        )
+        # (context list, rendered turns, rendered text) from the last chat() call
+        self._history_cache = None
+
+    def _prompt_cache_path(self, key: str) -> Path:
+        """Cache file for a conversation or prompt, keyed by its opening text"""
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return self._prompt_cache_dir / f"{digest}.bin"
 
     def generate(self, prompt: str, **kwargs) -> str:
         """
@@ -63,10 +79,31 @@ class LocalLLM:
         Returns:
             Generated text
         """
-        # current_model = self.engine.model_manager.get_current_model()
-        model_info = self.engine.model_manager.get_model_info()
+        self._check_large_model()
+        return self.engine.generate(prompt, **kwargs)
+
+    def generate_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """
+        Generate text from a prompt, yielding chunks as they are produced.
+
+        Args:
+            prompt: The input prompt
+            **kwargs: Parameter overrides (temperature, max_tokens, etc.)
+
+        Returns:
+            Iterator over generated text chunks
+        """
+        self._check_large_model()
+        return self.engine.generate_stream(prompt, **kwargs)
+
+    def generate_batch(self, prompts: List[str], **kwargs) -> List[str]:
+        """Generate a response for each prompt, batched by llama-server"""
+        self._check_large_model()
+        return self.engine.generate_batch(prompts, **kwargs)
 
-        if model_info.get("size_gb", 0) > 50:
+    def _check_large_model(self):
+        """Warn about (or refuse) generation on very large models"""
+        if self._is_large_model:
             profile_name = getattr(self.engine, "current_memory_profile", "unknown")
             if profile_name in ["mmap_aggressive", "ultra_conservative"]:
                 print(f"⚠️  Large model detected - this may take several minutes")
@@ -76,13 +113,12 @@ class LocalLLM:
                     raise RuntimeError(
                         "Large model generation disabled. Set allow_slow_models=True"
                     )
-        return self.engine.generate(prompt, **kwargs)
 
     def estimate_generation_time(
         self, prompt: str, max_tokens: int = 300
     ) -> Dict[str, Any]:
         """Estimate how long generation will take"""
-        model_info = self.engine.model_manager.get_model_info()
+        model_info = self.engine.get_model_info()
         model_size_gb = model_info.get("size_gb", 0)
 
         if hasattr(self.engine, "memory_manager"):
@@ -122,28 +158,59 @@ class LocalLLM:
         """Chat with memory-aware warnings"""
         # Build prompt with context (existing logic)
         if context:
-            prompt_parts = []
-            for i, ctx_msg in enumerate(context):
-                if i % 2 == 0:
-                    prompt_parts.append(f"Human: {ctx_msg}")
-                else:
-                    prompt_parts.append(f"Assistant: {ctx_msg}")
-            prompt_parts.append(f"Human: {message}")
-            prompt_parts.append("Assistant:")
-            prompt = "\n".join(prompt_parts)
+            prompt = f"{self._render_history(context)}Human: {message}\nAssistant:"
         else:
             prompt = f"Human: {message}\nAssistant:"
 
+        # Same conversation -> same cache file, so earlier turns skip prefill
+        kwargs.setdefault(
+            "prompt_cache", self._prompt_cache_path(context[0] if context else message)
+        )
+
         # Use generate_with_progress for large models
-        model_info = self.engine.model_manager.get_model_info()
-        if model_info.get("size_gb", 0) > 50:
+        if self._is_large_model:
             return self.generate_with_progress(prompt, **kwargs)
         else:
             return self.generate(prompt, **kwargs)
 
+    def _render_history(self, context: List[str]) -> str:
+        """
+        Render alternating Human/Assistant turns, one per line.
+
+        Repeat calls with the same (append-only) list only render the new
+        turns; pass a fresh list if earlier messages were edited.
+        """
+        start, rendered = 0, ""
+        if self._history_cache is not None:
+            cached_context, cached_turns, cached_text = self._history_cache
+            if cached_context is context and cached_turns <= len(context):
+                start, rendered = cached_turns, cached_text
+
+        buf = io.StringIO()
+        buf.write(rendered)
+        for i in range(start, len(context)):
+            buf.write("Human: " if i % 2 == 0 else "Assistant: ")
+            buf.write(context[i])
+            buf.write("\n")
+
+        rendered = buf.getvalue()
+        self._history_cache = (context, len(context), rendered)
+        return rendered
+
+    def _refresh_model_flags(self):
+        """Recompute per-model flags checked on every generation"""
+        model_info = self.engine.get_model_info()
+        self._is_large_model = model_info.get("size_gb", 0) > 50
+
     def set_model(self, model_name: str):
         """Switch to a different model"""
         self.engine.set_model(model_name)
+        self._refresh_model_flags()
+        return self
+
+    def warmup(self):
+        """Start llama-server and load the model before the first request"""
+        self.engine.warmup()
         return self
 
     def set_preset(self, preset_name: str):
@@ -168,6 +235,12 @@ class LocalLLM:
         """Quick switch to default preset"""
         return self.set_preset("default")
 
+    def close(self):
+        """Shut down the background llama-server and drop prompt caches"""
+        self.engine.close()
+        self.benchmark.close()
+        self._remove_prompt_cache()
+
     # Information methods
     def available_models(self) -> List[str]:
         """Get list of available models"""
@@ -199,14 +272,12 @@ class LocalLLM:
     ) -> Dict[str, str]:
         """Experiment with memory awareness"""
         if presets is None:
-            presets = ["default", "creative", "precise"]
+            presets = LLMBenchmark.DEFAULT_PRESETS
 
-        results = {}
-        original_preset = self.current_preset()
+        results = {f"preset_{preset}": None for preset in presets}
 
         # Warn about large model experiments
-        model_info = self.engine.model_manager.get_model_info()
-        if model_info.get("size_gb", 0) > 50:
+        if self._is_large_model:
             print(f"⚠️  Large model experiment - each preset may take several minutes")
             total_estimate = self.estimate_generation_time(
                 prompt, kwargs.get("max_tokens", 100)
@@ -217,17 +288,26 @@ class LocalLLM:
                     f"   Total estimated time: {total_time:.1f} minutes for {len(presets)} presets"
                 )
 
-        try:
-            for preset in presets:
-                try:
-                    self.set_preset(preset)
-                    # Use regular generate (not generate_with_progress to avoid spam)
-                    response = self.generate(prompt, max_tokens=100, **kwargs)
-                    results[f"preset_{preset}"] = response
-                except Exception as e:
-                    results[f"preset_{preset}"] = f"Error: {str(e)}"
-        finally:
-            self.set_preset(original_preset)
+        # Presets travel with each run, so the active preset is never touched
+        param_sets = []
+        run_presets = []
+        for preset in presets:
+            try:
+                preset_params = self.engine.param_manager.describe_preset(preset)
+            except Exception as e:
+                results[f"preset_{preset}"] = f"Error: {str(e)}"
+                continue
+            param_sets.append({**preset_params, "max_tokens": 100, **kwargs})
+            run_presets.append(preset)
+
+        self._check_large_model()
+        responses = self.engine.generate_multi(
+            prompt, param_sets, return_exceptions=True
+        )
+        for preset, response in zip(run_presets, responses):
+            if isinstance(response, Exception):
+                response = f"Error: {str(response)}"
+            results[f"preset_{preset}"] = response
 
         return results
 
@@ -240,17 +320,14 @@ class LocalLLM:
         # Merge template params with any provided kwargs
         generation_params = {**template_params}
         # Remove template variables from generation params
-        template_vars = set(
-            self.templates.get_template(template_name).template.split("{")
-        )
-        template_vars = {var.split("}")[0] for var in template_vars if "}" in var}
+        template_vars = self.templates.get_template_vars(template_name)
         generation_params = {
             k: v for k, v in generation_params.items() if k not in template_vars
         }
 
         return self.generate(prompt, **generation_params)
 
-    def list_templates(self) -> List[str]:
+    def list_templates(self) -> Tuple[str, ...]:
         """Get available prompt templates"""
         return self.templates.list_templates()
 
@@ -263,9 +340,18 @@ class LocalLLM:
         """Benchmark different presets"""
         return self.benchmark.benchmark_presets(prompt, presets)
 
-    def stress_test(self, prompt: str, iterations: int = 5, **kwargs):
-        """Run stress test"""
-        return self.benchmark.stress_test(prompt, iterations, **kwargs)
+    def stress_test(
+        self,
+        prompt: str,
+        iterations: int = 5,
+        max_workers: Optional[int] = None,
+        batched: bool = False,
+        **kwargs,
+    ):
+        """Run stress test (concurrently when a llama-server is in use)"""
+        return self.benchmark.stress_test(
+            prompt, iterations, max_workers, batched, **kwargs
+        )
 
     def quick_benchmark(self, prompt: str = "Tell me a short story about robots."):
         """Run a quick benchmark"""
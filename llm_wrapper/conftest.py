@@ -0,0 +1,37 @@
+import pytest
+
+from api.local_llm import LocalLLM
+from core.inference_engine import InferenceEngine
+
+
+# Model discovery, YAML parsing and llama-server start-up happen once per
+# session; the function-scoped fixtures below reset per-test state
+
+
+@pytest.fixture(scope="session")
+def _session_llm():
+    llm = LocalLLM()
+    yield llm
+    llm.close()
+
+
+@pytest.fixture(scope="session")
+def _session_engine():
+    engine = InferenceEngine()
+    engine.set_model("mistral-7b-base")
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def llm(_session_llm):
+    """Shared LocalLLM, back on the default preset after each test"""
+    yield _session_llm
+    _session_llm.default()
+
+
+@pytest.fixture
+def engine(_session_engine):
+    """Shared InferenceEngine, back on the default preset after each test"""
+    yield _session_engine
+    _session_engine.set_preset("default")
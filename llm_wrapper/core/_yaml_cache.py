@@ -0,0 +1,99 @@
+import copy
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Tuple, Union
+
+import yaml
+
+# libyaml's C parser when PyYAML was built with it, else pure Python
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+# Absolute path -> (mtime, size, parsed data), least recently used first
+_CACHE: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+_MAX = 100
+
+
+def load_yaml(path: Union[str, Path], copy_result: bool = True) -> Dict:
+    """
+    Load a YAML file, reusing the parsed result while the file is unchanged.
+    Returns a deep copy by default so callers can mutate it freely.
+    """
+    key = os.path.abspath(path)
+    st = os.stat(key)
+
+    cached = _CACHE.get(key)
+    if cached is not None and cached[:2] == (st.st_mtime, st.st_size):
+        _CACHE.move_to_end(key)
+        data = cached[2]
+    else:
+        data = _load_json_cache(key, st)
+        if data is None:
+            with open(key) as f:
+                data = yaml.load(f, Loader=_Loader)
+            _write_json_cache(key, st, data)
+        _CACHE[key] = (st.st_mtime, st.st_size, data)
+        _CACHE.move_to_end(key)
+        if len(_CACHE) > _MAX:
+            _CACHE.popitem(last=False)
+
+    return copy.deepcopy(data) if copy_result else data
+
+
+def _json_cache_path(path: str) -> Path:
+    """Sibling JSON file holding the parsed YAML (models.yaml -> models.cached.json)"""
+    return Path(path).with_suffix(".cached.json")
+
+
+def _load_json_cache(path: str, st: os.stat_result) -> Any:
+    """Return data from the JSON side cache if it was written for this exact file"""
+    try:
+        with open(_json_cache_path(path)) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if cached.get("mtime_ns") != st.st_mtime_ns or cached.get("size") != st.st_size:
+        return None  # YAML changed since the cache was written
+    return cached.get("data")
+
+
+def _write_json_cache(path: str, st: os.stat_result, data: Any):
+    """Persist parsed YAML as JSON (atomically) so later processes skip YAML parsing"""
+    try:
+        text = json.dumps(
+            {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "data": data}
+        )
+    except (TypeError, ValueError):
+        return  # YAML values JSON can't represent
+    # json.dumps turns int/bool/None mapping keys into strings; data that
+    # doesn't round-trip would load differently from the side cache
+    if json.loads(text)["data"] != data:
+        return
+
+    cache_path = _json_cache_path(path)
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Read-only config dir: skip it
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def invalidate(path: Union[str, Path]):
+    """Drop a file from both caches so the next load re-parses the YAML"""
+    key = os.path.abspath(path)
+    _CACHE.pop(key, None)
+    try:
+        os.unlink(_json_cache_path(key))
+    except OSError:
+        pass
@@ -1,30 +1,108 @@
+import codecs
+import logging
+import os
+import select
 import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Iterator, Tuple
 from .parameter_manager import ParameterManager
 from .model_manager import ModelManager
 from .universal_memory_manager import UniversalMemoryManager
+from .llama_server import LlamaServer
+
+logger = logging.getLogger(__name__)
+
+# Managed generation parameters: (name, llama-cli flag, /completion field, default)
+_PARAM_SCHEMA = (
+    ("max_tokens", "-n", "n_predict", 300),
+    ("temperature", "--temp", "temperature", 0.8),
+    ("top_p", "--top-p", "top_p", 0.9),
+    ("repeat_penalty", "--repeat-penalty", "repeat_penalty", 1.15),
+    ("repeat_last_n", "--repeat-last-n", "repeat_last_n", 64),
+)
+_PARAM_DEFAULTS = {name: default for name, _, _, default in _PARAM_SCHEMA}
+
+# Log lines llama.cpp can still leak onto stdout (tuple: one C-level startswith)
+_LOG_PREFIXES = ("llama_", "ggml_", "main:", "system_info")
 
 
 class InferenceEngine:
-    def __init__(self, config_dir: str = "config"):
+    def __init__(
+        self,
+        config_dir: str = "config",
+        use_server: bool = True,
+        server_parallel: int = 4,
+    ):
         self.config_dir = Path(config_dir)
         self.model_manager = ModelManager(config_dir)
         self.param_manager = ParameterManager(config_dir)
         self.memory_manager = UniversalMemoryManager()
         self.current_memory_profile = None
+        # Model info per model name, so hot paths skip the filesystem checks
+        self._model_info_cache: Dict[str, Dict] = {}
+        # Executable + managed sampling flags, rebuilt when model/params change
+        self._base_cmd: tuple = ()
+        self._base_cmd_key: Optional[tuple] = None
+        self._base_params: Dict[str, Any] = {}
+
+        # Persistent llama-server (falls back to one-shot CLI when unavailable)
+        self.use_server = use_server
+        self.server: Optional[LlamaServer] = None
+        self._server_model: Optional[str] = None
+        # Request slots llama-server batches together (--parallel)
+        self.server_parallel = server_parallel
+        self._server_slots = 1
+        self._server_lock = threading.Lock()
+
+    @property
+    def server_proc(self):
+        """Handle on the running llama-server process (None in CLI mode)"""
+        return self.server.process if self.server else None
+
+    @property
+    def server_slots(self) -> int:
+        """Requests the running llama-server processes at once (1 until started)"""
+        return self._server_slots
+
+    @property
+    def uses_server(self) -> bool:
+        """Whether generation goes through the persistent llama-server"""
+        if not self.use_server or not self.model_manager.get_current_model():
+            return False
+        return self.get_model_info()["server_exists"]
 
     def set_model(self, model_name: str):
         """Set the active model"""
-        return self.model_manager.set_model(model_name)
+        self._model_info_cache.clear()
+        result = self.model_manager.set_model(model_name)
+        # A server is already up: swap models now rather than on the next call
+        if (
+            self.server
+            and self.server.is_running()
+            and self._server_model != model_name
+        ):
+            self.warmup()
+        return result
+
+    def warmup(self):
+        """Load the current model into llama-server ahead of the first request"""
+        model_info = self._current_model_info()
+        if self.use_server and model_info["server_exists"]:
+            self._ensure_server(model_info)
 
     def get_available_models(self):
         """Get list of available models"""
         return self.model_manager.get_available_models()
 
     def get_model_info(self, model_name: Optional[str] = None):
-        """Get model information"""
-        return self.model_manager.get_model_info(model_name)
+        """Get model information (cached per model name - treat as read-only)"""
+        key = model_name or self.model_manager.get_current_model()
+        if key not in self._model_info_cache:
+            self._model_info_cache[key] = self.model_manager.get_model_info(key)
+        return self._model_info_cache[key]
 
     def auto_select_model(self):
         """Auto-select first available model"""
@@ -38,8 +116,8 @@ class InferenceEngine:
         """Set individual parameters"""
         self.param_manager.set_parameters(**kwargs)
 
-    def generate(self, prompt: str, **kwargs) -> str:
-        """Generate text using the current model"""
+    def _current_model_info(self) -> Dict:
+        """Model info for the active model, auto-selecting one if needed"""
         current_model = self.model_manager.get_current_model()
         if not current_model:
             # Try to auto-select a model
@@ -47,28 +125,230 @@ class InferenceEngine:
             if not selected:
                 raise ValueError("No models available. Check your configuration.")
 
+        return self.get_model_info()
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        """Generate text using the current model"""
         # Get model info
-        model_info = self.model_manager.get_model_info()
+        model_info = self._current_model_info()
 
         # Get parameters (managed parameters + any kwargs overrides)
         params = self.param_manager.get_parameters()
         params.update(kwargs)  # Allow temporary overrides
 
+        # Persistent server: model stays loaded, only the request is sent
+        if self.use_server and model_info["server_exists"]:
+            server = self._ensure_server(model_info)
+            return server.complete(self._build_payload(prompt, params))
+
         # Build command with parameters
-        command_result = self._build_command(model_info, prompt, params)
-        # Handle the tuple return from _build_command
-        if isinstance(command_result, tuple):
-            command, profile_config = command_result
-        else:
-            command = command_result
+        command, profile_config = self._build_command(model_info, prompt, params)
         # Execute and return result
         return self._execute_command(command)
 
-    def _build_command(self, model_info: Dict, prompt: str, params: Dict) -> list:
-        """Build the llama.cpp command"""
-        # Use the full paths from model info
-        executable = model_info["executable_full_path"]
-        model_path = model_info["model_full_path"]
+    def generate_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """
+        Generate text incrementally, yielding chunks as llama.cpp produces them.
+
+        The server path yields tokens; the CLI path yields whole output lines.
+        """
+        model_info = self._current_model_info()
+
+        params = self.param_manager.get_parameters()
+        params.update(kwargs)
+
+        if self.use_server and model_info["server_exists"]:
+            server = self._ensure_server(model_info)
+            yield from server.stream(self._build_payload(prompt, params))
+            return
+
+        command, profile_config = self._build_command(model_info, prompt, params)
+        yield from self._stream_command(command)
+
+    def generate_multi(
+        self,
+        prompt: str,
+        param_sets: List[Dict[str, Any]],
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """
+        Generate one response per parameter set for the same prompt.
+
+        The model load and prompt prefill are paid once: the server keeps both
+        warm between requests, and the CLI path writes a prompt cache on the
+        first run that later runs open read-only.
+
+        Args:
+            prompt: The input prompt shared by every run
+            param_sets: Parameter overrides, one dict per run
+            return_exceptions: Return failures in place of results instead of raising
+
+        Returns:
+            Generated texts (or exceptions), in the order of param_sets
+        """
+        model_info = self._current_model_info()
+        base_params = self.param_manager.get_parameters()
+        results = []
+
+        if self.use_server and model_info["server_exists"]:
+            return self._generate_concurrently(
+                model_info,
+                base_params,
+                [(prompt, overrides) for overrides in param_sets],
+                return_exceptions,
+            )
+
+        with tempfile.TemporaryDirectory(prefix="llm_wrapper_multi_") as cache_dir:
+            cache_path = Path(cache_dir) / "prompt.bin"
+            cache_written = False
+
+            for overrides in param_sets:
+                params = {**base_params, **overrides}
+                try:
+                    params.setdefault("prompt_cache", cache_path)
+                    params.setdefault("prompt_cache_ro", cache_written)
+                    command, profile_config = self._build_command(
+                        model_info, prompt, params
+                    )
+                    results.append(self._execute_command(command))
+                    cache_written = True
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results.append(e)
+
+        return results
+
+    def generate_batch(
+        self, prompts: List[str], return_exceptions: bool = False, **kwargs
+    ) -> List[Any]:
+        """
+        Generate one response per prompt with the same parameters.
+
+        With llama-server every prompt is in flight at once and the server's
+        slots batch them; the CLI path runs them one after another.
+
+        Args:
+            prompts: Input prompts
+            return_exceptions: Return failures in place of results instead of raising
+            **kwargs: Parameter overrides applied to every prompt
+
+        Returns:
+            Generated texts (or exceptions), in the order of prompts
+        """
+        model_info = self._current_model_info()
+        base_params = {**self.param_manager.get_parameters(), **kwargs}
+
+        if self.use_server and model_info["server_exists"]:
+            return self._generate_concurrently(
+                model_info,
+                base_params,
+                [(prompt, {}) for prompt in prompts],
+                return_exceptions,
+            )
+
+        results = []
+        for prompt in prompts:
+            try:
+                command, profile_config = self._build_command(
+                    model_info, prompt, base_params
+                )
+                results.append(self._execute_command(command))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    def _generate_concurrently(
+        self,
+        model_info: Dict,
+        base_params: Dict,
+        jobs: List[tuple],
+        return_exceptions: bool,
+    ) -> List[Any]:
+        """Send every (prompt, overrides) job to llama-server at once"""
+        try:
+            server = self._ensure_server(model_info)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return [e] * len(jobs)
+
+        def run(job):
+            prompt, overrides = job
+            params = {**base_params, **overrides}
+            try:
+                return server.complete(self._build_payload(prompt, params))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        with ThreadPoolExecutor(max_workers=self._server_slots) as pool:
+            return list(pool.map(run, jobs))
+
+    def _ensure_server(self, model_info: Dict) -> LlamaServer:
+        """Start llama-server for the current model, reusing it when possible"""
+        # Concurrent callers must not race to launch two servers
+        with self._server_lock:
+            current_model = self.model_manager.get_current_model()
+            if (
+                self.server
+                and self._server_model == current_model
+                and self.server.is_running()
+            ):
+                return self.server
+
+            # Model changed (or server died) - free the old one before loading
+            self.close()
+
+            profile_name, profile_config = self._select_profile(model_info)
+            # Parallel slots split the context, so only models that fit in RAM
+            # get more than one
+            slots = self.server_parallel if profile_name == "direct" else 1
+            server_args = self._model_args(
+                model_info, profile_name, profile_config, slots
+            )
+            if slots > 1:
+                server_args.extend(["--parallel", str(slots), "--cont-batching"])
+
+            self.server = LlamaServer(model_info["server_full_path"], server_args)
+            logger.info("🚀 Starting llama-server on port %d...", self.server.port)
+            self.server.start()
+            self._server_model = current_model
+            self._server_slots = slots
+            return self.server
+
+    def _params_to_json(self, params: Dict) -> Dict[str, Any]:
+        """/completion fields for the managed parameters"""
+        return {
+            key: params.get(name, default) for name, _, key, default in _PARAM_SCHEMA
+        }
+
+    def _params_to_cli(
+        self, params: Dict, formatted: Optional[Dict[str, str]] = None
+    ) -> List[str]:
+        """llama-cli flags for the managed parameters present in params"""
+        formatted = formatted or {}
+        return [
+            arg
+            for name, flag, _, _ in _PARAM_SCHEMA
+            if name in params
+            for arg in (flag, formatted.get(name) or str(params[name]))
+        ]
+
+    def _build_payload(self, prompt: str, params: Dict) -> Dict[str, Any]:
+        """Build the /completion request body"""
+        return {
+            "prompt": prompt,
+            **self._params_to_json(params),
+            # Reuse the slot's KV cache for a matching prompt prefix
+            "cache_prompt": True,
+        }
+
+    def _select_profile(self, model_info: Dict):
+        """Select and log the memory profile for a model"""
         model_size_gb = model_info.get("size_gb", 0)
 
         # Select optimal memory profile
@@ -77,31 +357,49 @@ class InferenceEngine:
         )
         self.current_memory_profile = profile_name
 
-        # Estimate performance
-        performance = self.memory_manager.estimate_performance(
-            model_size_gb, profile_config
-        )
-        # Log strategy
-        print(f"🧠 Memory Strategy: {profile_name}")
-        print(
-            f"   Model: {model_size_gb:.1f}GB, RAM: {self.memory_manager.system_info['available_ram_gb']:.1f}GB"
-        )
-        print(
-            f"   Expected: {performance['estimated_tokens_per_second']:.1f} tokens/sec"
-        )
-        print(
-            f"   Loading time: ~{performance['estimated_loading_time_minutes']:.1f} minutes"
-        )
-        # Start with base command
-        command = [executable, "-m", model_path]
+        # Log strategy (skip building the arguments when nobody listens)
+        if logger.isEnabledFor(logging.INFO):
+            performance = self.memory_manager.estimate_performance(
+                model_size_gb, profile_config
+            )
+            logger.info(
+                "🧠 Memory Strategy: %s\n"
+                "   Model: %.1fGB, RAM: %.1fGB\n"
+                "   Expected: %.1f tokens/sec\n"
+                "   Loading time: ~%.1f minutes",
+                profile_name,
+                model_size_gb,
+                self.memory_manager.system_info["available_ram_gb"],
+                performance["estimated_tokens_per_second"],
+                performance["estimated_loading_time_minutes"],
+            )
+        return profile_name, profile_config
+
+    def _model_args(
+        self,
+        model_info: Dict,
+        profile_name: str,
+        profile_config: Dict,
+        slots: int = 1,
+    ) -> list:
+        """Load-time arguments shared by llama-cli and llama-server"""
+        model_size_gb = model_info.get("size_gb", 0)
+        args = ["-m", model_info["model_full_path"]]
+
+        # Generation and prompt-processing threads; gains flatten past ~16
+        threads = str(min(self.memory_manager.system_info["usable_cores"], 16))
+        args.extend(["-t", threads, "-tb", threads])
 
         # Memory management flags
         if profile_config["mmap"]:
-            command.extend(["--mmap"])
+            args.extend(["--mmap"])
 
         # Context and batch size
-        command.extend(["-c", str(profile_config["context_size"])])
-        command.extend(["-b", str(profile_config["batch_size"])])
+        # Each request slot gets the full profile context
+        args.extend(["-c", str(profile_config["context_size"] * slots)])
+        # Logical batch for prompt processing, physical (ubatch) per compute pass
+        args.extend(["--batch-size", str(profile_config["batch_size"])])
+        args.extend(["--ubatch-size", str(profile_config["ubatch_size"])])
 
         # GPU layers
         if "gpu_layers" in profile_config:
@@ -111,88 +409,157 @@ class InferenceEngine:
                 estimated_layers, profile_config, model_size_gb
             )
             if gpu_layers > 0:
-                command.extend(["-ngl", str(gpu_layers)])
+                args.extend(["-ngl", str(gpu_layers)])
+
+        # KV cache placement and precision
+        if not profile_config.get("kv_offload", True):
+            args.extend(["--no-kv-offload"])
+        if profile_config.get("kv_type_k", "f16") != "f16":
+            args.extend(["-ctk", profile_config["kv_type_k"]])
+        if profile_config.get("kv_type_v", "f16") != "f16":
+            args.extend(["-ctv", profile_config["kv_type_v"]])
 
         # Memory locking for performance (when possible)
         if profile_name == "direct":
-            command.extend(["--mlock"])
-        # Add prompt
-        command.extend(["-p", prompt])
-        # Add parameters to command
-        command.extend(["-n", str(params.get("max_tokens", 300))])
-        command.extend(["-t", str(params.get("temperature", 0.8))])
-        command.extend(["--top-p", str(params.get("top_p", 0.9))])
-        command.extend(["--repeat-penalty", str(params.get("repeat_penalty", 1.15))])
-        command.extend(["--repeat-last-n", str(params.get("repeat_last_n", 64))])
-
-        return command, profile_config
-
-    def _execute_command(self, command_info) -> str:
-        """Execute the llama.cpp command and return output"""
-        # Debug: Print what we received
-        print(f"DEBUG: command_info type: {type(command_info)}")
-        print(f"DEBUG: command_info content: {command_info}")
-        # Handle both old format (just command) and new format (command, profile)
-        if isinstance(command_info, tuple):
-            command, resource_limits = command_info
-        else:
-            command = command_info
-            resource_limits = {}
-        # Debug: Print the final command
-        print(f"DEBUG: final command type: {type(command)}")
-        print(f"DEBUG: final command: {command}")
-        # Make sure command is a list of strings
-        if not isinstance(command, list):
-            raise RuntimeError(f"Command should be a list, got {type(command)}")
-
-        # Check each element is a string
-        for i, item in enumerate(command):
-            if not isinstance(item, str):
-                raise RuntimeError(
-                    f"Command item {i} should be string, got {type(item)}: {item}"
-                )
+            args.extend(["--mlock"])
 
-        try:
-            print(f"🔄 Executing: {' '.join(command[:4])}... (truncated)")
+        return args
 
-            result = subprocess.run(
-                command,  # Make sure this is a list of strings
-                capture_output=True,
-                text=True,
-                timeout=120,  # 2 minute timeout
+    def _base_command(self, model_info: Dict) -> tuple:
+        """Immutable command prefix for the current model and managed parameters"""
+        key = (
+            model_info["executable_full_path"],
+            self.param_manager.current_preset,
+            tuple(self.param_manager.custom_params.items()),
+        )
+        if key != self._base_cmd_key:
+            self._base_params = {
+                **_PARAM_DEFAULTS,
+                **self.param_manager.get_parameters(),
+            }
+            self._base_cmd = (
+                model_info["executable_full_path"],
+                *self._params_to_cli(
+                    self._base_params, self.param_manager.get_formatted()
+                ),
             )
+            self._base_cmd_key = key
+        return self._base_cmd
+
+    def _build_command(
+        self, model_info: Dict, prompt: str, params: Dict
+    ) -> Tuple[List[str], Dict]:
+        """Build the llama.cpp command; returns (command, profile config)"""
+        profile_name, profile_config = self._select_profile(model_info)
+
+        # Start with the cached base command
+        command = list(self._base_command(model_info))
+        command.extend(self._model_args(model_info, profile_name, profile_config))
+
+        # Per-call overrides come later on the command line, so they win
+        overrides = {
+            name: value
+            for name, value in params.items()
+            if name in _PARAM_DEFAULTS and value != self._base_params[name]
+        }
+        command.extend(self._params_to_cli(overrides))
 
-            if result.returncode != 0:
-                raise RuntimeError(f"Command failed: {result.stderr}")
-
-            # Parse output (llama.cpp includes prompt in output, so we need to extract just the generation)
-            output = result.stdout.strip()
-            return self._parse_output(output)
-
-        except subprocess.TimeoutExpired:
-            raise RuntimeError("Generation timed out after 2 minutes")
-        except Exception as e:
-            raise RuntimeError(f"Execution failed: {str(e)}")
-
-    def _parse_output(self, raw_output: str) -> str:
-        """Extract just the generated text from llama.cpp output"""
-        lines = raw_output.split("\n")
+        # Explicit GPU offload request (later -ngl wins over the profile's)
+        if "gpu_layers" in params:
+            command.extend(["-ngl", str(params["gpu_layers"])])
 
-        generation_lines = []
-        found_generation = False
+        # Print only the generated text: no logs, no prompt echo
+        command.extend(["--log-disable", "--no-display-prompt"])
 
-        for line in lines:
-            if not line.strip() or line.startswith("llama_"):
-                continue
+        # Add the prompt
+        command.extend(["-p", prompt])
 
-            if not found_generation and len(line.strip()) > 10:
-                found_generation = True
+        # Prompt cache: restore KV state for a matching prefix instead of
+        # re-running prefill (read-only keeps the saved state untouched)
+        if params.get("prompt_cache"):
+            command.extend(["--prompt-cache", str(params["prompt_cache"])])
+            if params.get("prompt_cache_ro"):
+                command.extend(["--prompt-cache-ro"])
+            else:
+                command.extend(["--prompt-cache-all"])
 
-            if found_generation:
-                generation_lines.append(line)
+        return command, profile_config
 
-        result = "\n".join(generation_lines).strip()
-        return result if result else raw_output.strip()
+    def _execute_command(self, command: List[str]) -> str:
+        """Execute the llama.cpp command and return output"""
+        return "".join(self._stream_command(command)).strip()
+
+    def _stream_command(
+        self, command: List[str], idle_timeout: float = 120
+    ) -> Iterator[str]:
+        """Run the llama.cpp command and yield generated lines as they arrive"""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Executing: %s ... (truncated)", " ".join(command[:4]))
+
+        # stderr goes to a file so a chatty llama.cpp can't block on a full pipe
+        with tempfile.TemporaryFile() as stderr_file:
+            # close_fds=False lets CPython launch via posix_spawn instead of
+            # fork+exec, which gets slower as this process's RSS grows; our
+            # own descriptors are non-inheritable (PEP 446) anyway
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=stderr_file,
+                close_fds=False,
+            )
+            try:
+                stdout_fd = process.stdout.fileno()
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                pending = ""
+
+                while True:
+                    # Timeout only when llama.cpp goes quiet, not on long outputs
+                    ready, _, _ = select.select([stdout_fd], [], [], idle_timeout)
+                    if not ready:
+                        raise RuntimeError(
+                            f"Generation stalled: no output for {idle_timeout:g}s"
+                        )
+
+                    chunk = os.read(stdout_fd, 4096)
+                    if not chunk:
+                        break
+
+                    pending += decoder.decode(chunk)
+                    *lines, pending = pending.split("\n")
+                    for line in lines:
+                        # Output is clean already; drop stray log lines only
+                        if not line.startswith(_LOG_PREFIXES):
+                            yield line + "\n"
+
+                # Flush a final line that has no trailing newline
+                pending += decoder.decode(b"", final=True)
+                if pending and not pending.startswith(_LOG_PREFIXES):
+                    yield pending
+
+                if process.wait() != 0:
+                    stderr_file.seek(0)
+                    stderr = stderr_file.read().decode(errors="replace")
+                    raise RuntimeError(f"Command failed: {stderr}")
+            finally:
+                # Also reached when the caller stops consuming the stream early
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+
+    def close(self):
+        """Shut down the persistent llama-server, if any"""
+        if self.server:
+            self.server.close()
+        self.server = None
+        self._server_model = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
 
     def get_parameter_info(self) -> Dict[str, Any]:
         """Get current parameter information"""
@@ -204,7 +571,7 @@ class InferenceEngine:
             "model_stats": self.model_manager.get_model_stats(),
             "parameter_info": self.param_manager.get_parameter_info(),
             "current_model_info": (
-                self.model_manager.get_model_info()
+                self.get_model_info()
                 if self.model_manager.get_current_model()
                 else None
             ),
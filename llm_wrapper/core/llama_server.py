@@ -0,0 +1,149 @@
+import json
+import socket
+import subprocess
+import tempfile
+import time
+from typing import Dict, Any, List, Optional, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def _find_free_port(host: str) -> int:
+    """Ask the OS for an unused TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class LlamaServer:
+    """
+    Persistent llama.cpp server process.
+    Loads the model once and serves every completion over HTTP.
+    """
+
+    def __init__(
+        self,
+        executable: str,
+        model_args: List[str],
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+    ):
+        self.executable = executable
+        self.model_args = model_args
+        self.host = host
+        self.port = port or _find_free_port(host)
+        self.url = f"http://{host}:{self.port}"
+        self.process: Optional[subprocess.Popen] = None
+        self._log_file = None
+
+        # Keep-alive connection pool shared by every request to this server
+        self._http = requests.Session()
+        self._http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+    def start(self, startup_timeout: float = 600.0):
+        """Launch llama-server and wait until the model is loaded"""
+        if self.is_running():
+            return
+
+        command = [
+            self.executable,
+            *self.model_args,
+            "--host",
+            self.host,
+            "--port",
+            str(self.port),
+        ]
+        # llama-server logs heavily to stderr; a file avoids filling a pipe
+        self._log_file = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=self._log_file,
+            close_fds=False,  # Allows the posix_spawn fast path
+        )
+        self._wait_until_ready(startup_timeout)
+
+    def _wait_until_ready(self, startup_timeout: float):
+        """Poll /health until the server reports the model is loaded"""
+        deadline = time.monotonic() + startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                log_tail = self._read_log_tail()
+                self.close()
+                raise RuntimeError(f"llama-server exited during startup: {log_tail}")
+
+            try:
+                response = self._http.get(f"{self.url}/health", timeout=2)
+                if response.status_code == 200:
+                    return
+            except requests.ConnectionError:
+                pass  # Socket not open yet
+
+            time.sleep(0.25)
+
+        self.close()
+        raise RuntimeError(
+            f"llama-server did not become ready within {startup_timeout:.0f}s"
+        )
+
+    def _read_log_tail(self, max_bytes: int = 2000) -> str:
+        """Return the end of the server log for error messages"""
+        if self._log_file is None:
+            return ""
+        self._log_file.seek(0)
+        return self._log_file.read().decode(errors="replace")[-max_bytes:]
+
+    def is_running(self) -> bool:
+        """Check whether the server process is alive"""
+        return self.process is not None and self.process.poll() is None
+
+    def complete(self, payload: Dict[str, Any], timeout: float = 600.0) -> str:
+        """Run a single completion request and return the generated text"""
+        response = self._http.post(
+            f"{self.url}/completion", json=payload, timeout=timeout
+        )
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Completion failed ({response.status_code}): {response.text}"
+            )
+        return response.json()["content"].strip()
+
+    def stream(self, payload: Dict[str, Any], timeout: float = 600.0) -> Iterator[str]:
+        """Run a completion request and yield tokens as they are generated"""
+        with self._http.post(
+            f"{self.url}/completion",
+            json={**payload, "stream": True},
+            stream=True,
+            timeout=timeout,
+        ) as response:
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f"Completion failed ({response.status_code}): {response.text}"
+                )
+            # Server-sent events: one "data: {...}" line per token
+            for line in response.iter_lines():
+                if not line.startswith(b"data: "):
+                    continue
+                event = json.loads(line[len(b"data: ") :])
+                if event.get("content"):
+                    yield event["content"]
+                if event.get("stop"):
+                    return
+
+    def close(self):
+        """Close pooled connections and terminate the server (SIGTERM, then SIGKILL)"""
+        self._http.close()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
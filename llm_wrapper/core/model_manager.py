@@ -1,6 +1,18 @@
-import yaml
+import functools
+import logging
+import os
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, FrozenSet
+
+from ._yaml_cache import load_yaml, invalidate
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def _expand_path(path: str) -> Path:
+    """Expand ~ once per distinct path string (models often share an executable)"""
+    return Path(path).expanduser()
 
 
 class ModelManager:
@@ -13,36 +25,114 @@ class ModelManager:
     def _load_config(self, filename: str) -> Dict:
         """Load configuration from YAML file"""
         config_path = self.config_dir / filename
-        with open(config_path) as f:
-            return yaml.safe_load(f)
+        return load_yaml(config_path)
+
+    def _preferred_variant(self, model_info: Dict, model_path: Path) -> Optional[Path]:
+        """Find a quantized sibling of the model file (e.g. model-Q4_K_M.gguf)"""
+        quant = model_info.get("preferred_quant", self.models_config.get("preferred_quant"))
+        if not quant:
+            return None
+
+        if quant.lower() in model_path.name.lower():
+            return None  # Already the preferred quantization
+
+        for name in (
+            f"{model_path.stem}-{quant}{model_path.suffix}",
+            f"{model_path.stem}.{quant}{model_path.suffix}",
+            f"{model_path.stem}-{quant.lower()}{model_path.suffix}",
+            f"{model_path.stem}.{quant.lower()}{model_path.suffix}",
+        ):
+            candidate = model_path.with_name(name)
+            if self._exists(candidate):
+                return candidate
+        return None
+
+    def _exists(self, path: Path) -> bool:
+        """Existence check answered from one directory listing per parent"""
+        parent = path.parent
+        if parent not in self._dir_listings:
+            try:
+                with os.scandir(parent) as entries:
+                    self._dir_listings[parent] = frozenset(e.name for e in entries)
+            except OSError:
+                self._dir_listings[parent] = None
+        names = self._dir_listings[parent]
+        if names is None:
+            return path.exists()  # Unlistable parent: ask directly
+        return path.name in names
 
     def _validate_models(self):
         """Validate that configured models and executables exist"""
+        # Models and executables cluster in a few directories, so list each
+        # directory once instead of stat()ing every file
+        self._dir_listings: Dict[Path, Optional[FrozenSet[str]]] = {}
         for model_name, model_info in self.models_config["models"].items():
-            executable_path = Path(model_info["executable"]).expanduser()
-            model_path = Path(model_info["path"]).expanduser()
+            # Resolve paths once here so get_model_info is a plain lookup
+            self._resolve_paths(model_info)
+            executable_path = model_info["executable_full_path"]
+            model_path = model_info["model_full_path"]
 
             # Check if files exist
-            if not executable_path.exists():
-                print(
-                    f"⚠️  Warning: Executable not found for {model_name}: {executable_path}"
+            if not model_info["executable_exists"]:
+                logger.warning(
+                    "⚠️  Executable not found for %s: %s", model_name, executable_path
                 )
                 model_info["status"] = "executable_missing"
-            elif not model_path.exists():
-                print(
-                    f"⚠️  Warning: Model file not found for {model_name}: {model_path}"
+            elif not model_info["model_exists"]:
+                logger.warning(
+                    "⚠️  Model file not found for %s: %s", model_name, model_path
                 )
                 model_info["status"] = "model_missing"
             else:
                 model_info["status"] = "ready"
 
-    def get_available_models(self) -> List[str]:
-        """Get list of available model names"""
-        return [
+        # Index ready models so lookups don't rescan the whole config
+        self._ready_models = [
             name
             for name, info in self.models_config["models"].items()
-            if info.get("status") == "ready"
+            if info["status"] == "ready"
         ]
+        self._ready_set = set(self._ready_models)
+        self._dir_listings = {}  # Listings go stale; keep them per validation
+
+    def _resolve_paths(self, model_info: Dict):
+        """Add full paths and existence flags for the model's files"""
+        executable_path = _expand_path(model_info["executable"])
+        model_path = _expand_path(model_info["path"])
+        quantized_path = self._preferred_variant(model_info, model_path)
+        if quantized_path:
+            # Fewer bytes per weight: less RAM and less bandwidth per token
+            model_info["original_path"] = str(model_path)
+            model_info["quantization"] = model_info.get(
+                "preferred_quant", self.models_config.get("preferred_quant")
+            )
+            model_info["size_gb"] = quantized_path.stat().st_size / 1024**3
+            model_path = quantized_path
+        # llama-server usually sits next to llama-cli in the build directory
+        if "server_executable" in model_info:
+            server_path = _expand_path(model_info["server_executable"])
+        else:
+            server_path = executable_path.with_name("llama-server")
+
+        model_exists = self._exists(model_path)
+        if model_exists and "size_gb" not in model_info:
+            # Profile selection needs a real size; the file knows it
+            model_info["size_gb"] = model_path.stat().st_size / 1024**3
+
+        model_info.update(
+            {
+                "executable_exists": self._exists(executable_path),
+                "model_exists": model_exists,
+                "server_exists": self._exists(server_path),
+                "executable_full_path": str(executable_path),
+                "model_full_path": str(model_path),
+                "server_full_path": str(server_path),
+            }
+        )
+
+    def get_available_models(self) -> List[str]:
+        """Get list of available model names"""
+        return list(self._ready_models)
 
     def get_all_models(self) -> List[str]:
         """Get list of all configured models (including unavailable ones)"""
@@ -54,8 +144,8 @@ class ModelManager:
             available = self.get_available_models()
             raise ValueError(f"Model '{model_name}' not found. Available: {available}")
 
-        model_info = self.models_config["models"][model_name]
-        if model_info.get("status") != "ready":
+        if model_name not in self._ready_set:
+            model_info = self.models_config["models"][model_name]
             raise ValueError(
                 f"Model '{model_name}' is not ready. Status: {model_info.get('status')}"
             )
@@ -76,22 +166,9 @@ class ModelManager:
         if not model_name or model_name not in self.models_config["models"]:
             raise ValueError(f"Model '{model_name}' not found")
 
-        model_info = self.models_config["models"][model_name].copy()
-
-        # Add computed information
-        executable_path = Path(model_info["executable"]).expanduser()
-        model_path = Path(model_info["path"]).expanduser()
-
-        model_info.update(
-            {
-                "executable_exists": executable_path.exists(),
-                "model_exists": model_path.exists(),
-                "executable_full_path": str(executable_path),
-                "model_full_path": str(model_path),
-            }
-        )
-
-        return model_info
+        # Paths were resolved by _validate_models; copy so callers can't
+        # corrupt the config
+        return self.models_config["models"][model_name].copy()
 
     def get_model_stats(self) -> Dict[str, Any]:
         """Get statistics about all models"""
@@ -108,19 +185,19 @@ class ModelManager:
 
     def auto_select_model(self) -> Optional[str]:
         """Automatically select the first available model"""
-        available = self.get_available_models()
-        if available:
-            self.set_model(available[0])
-            return available[0]
+        if self._ready_models:
+            self.set_model(self._ready_models[0])
+            return self._ready_models[0]
         return None
 
     def reload_config(self):
         """Reload model configuration from file"""
+        invalidate(self.config_dir / "models.yaml")
         self.models_config = self._load_config("models.yaml")
         self._validate_models()
         print("✓ Model configuration reloaded")
 
         # Check if current model is still valid
-        if self.current_model and self.current_model not in self.get_available_models():
+        if self.current_model and self.current_model not in self._ready_set:
             print(f"⚠️  Current model '{self.current_model}' no longer available")
             self.current_model = None
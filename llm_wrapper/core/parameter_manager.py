@@ -1,7 +1,8 @@
-import yaml
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 
+from ._yaml_cache import load_yaml
+
 
 class ParameterManager:
     def __init__(self, config_dir: str = "config"):
@@ -9,12 +10,16 @@ class ParameterManager:
         self.params_config = self._load_config("parameters.yaml")
         self.current_preset = "default"
         self.custom_params = {}
+        # Limits table looked up once, not per validation
+        self._limits: Dict[str, List[float]] = self.params_config.get(
+            "parameter_limits", {}
+        )
+        self._refresh_params()
 
     def _load_config(self, filename: str) -> Dict:
         """Load configuration from YAML file"""
         config_path = self.config_dir / filename
-        with open(config_path) as f:
-            return yaml.safe_load(f)
+        return load_yaml(config_path)
 
     def set_preset(self, preset_name: str):
         """Set parameter preset"""
@@ -26,17 +31,19 @@ class ParameterManager:
 
         self.current_preset = preset_name
         self.custom_params = {}  # Clear custom overrides
+        self._refresh_params()
         print(f"✓ Parameter preset set to: {preset_name}")
 
     def set_parameter(self, param_name: str, value: Any):
         """Set individual parameter with validation"""
         if not self._validate_parameter(param_name, value):
-            limits = self.params_config.get("parameter_limits", {}).get(param_name)
+            limits = self._limits.get(param_name)
             raise ValueError(
                 f"Parameter '{param_name}' value {value} outside limits: {limits}"
             )
 
         self.custom_params[param_name] = value
+        self._refresh_params()
         print(f"✓ Set {param_name} = {value}")
 
     def set_parameters(self, **kwargs):
@@ -46,16 +53,25 @@ class ParameterManager:
 
     def get_parameters(self) -> Dict[str, Any]:
         """Get current parameters (preset + custom overrides)"""
-        preset_params = self.params_config["presets"][self.current_preset].copy()
-        preset_params.update(self.custom_params)
-        return preset_params
+        return self._merged.copy()
+
+    def _refresh_params(self):
+        """Re-merge current parameters and pre-format them as command-line strings"""
+        self._merged = {
+            **self.params_config["presets"][self.current_preset],
+            **self.custom_params,
+        }
+        self._formatted = {name: str(value) for name, value in self._merged.items()}
+
+    def get_formatted(self) -> Dict[str, str]:
+        """Get current parameters already converted to strings (read-only)"""
+        return self._formatted
 
     def _validate_parameter(self, param_name: str, value: Any) -> bool:
         """Validate parameter value against limits"""
-        limits = self.params_config.get("parameter_limits", {}).get(param_name)
-        if not limits:
-            return True  # No limits defined
-
+        limits = self._limits.get(param_name)
+        if limits is None:
+            return True
         min_val, max_val = limits
         return min_val <= value <= max_val
 
@@ -72,6 +88,7 @@ class ParameterManager:
     def reset_to_preset(self):
         """Clear custom parameters and return to current preset"""
         self.custom_params = {}
+        self._refresh_params()
         print(f"✓ Reset to preset: {self.current_preset}")
 
     def get_parameter_info(self) -> Dict[str, Any]:
@@ -81,5 +98,5 @@ class ParameterManager:
             "current_parameters": self.get_parameters(),
             "custom_overrides": self.custom_params,
             "available_presets": self.get_presets(),
-            "parameter_limits": self.params_config.get("parameter_limits", {}),
+            "parameter_limits": self._limits,
         }
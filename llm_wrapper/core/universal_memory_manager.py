@@ -1,10 +1,20 @@
 import psutil
 import os
+import re
+import time
+from functools import lru_cache
+from types import MappingProxyType
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Mapping, Optional, Tuple
 import subprocess
 
 
+# Hardware facts that can't change while the process runs, probed once
+_STATIC_SYS_INFO: Optional[Dict[str, Any]] = None
+# Free RAM/disk readings are reused for this long (seconds)
+_DYNAMIC_TTL = 1.0
+
+
 class UniversalMemoryManager:
     """
     Handles models of any size by automatically adapting memory strategies.
@@ -12,26 +22,125 @@ class UniversalMemoryManager:
     """
 
     def __init__(self):
-        self.system_info = self._detect_system_capabilities()
+        self._system_info: Dict[str, Any] = {}
+        self._system_info_expires = 0.0
         self.memory_profiles = self._define_memory_profiles()
+        # Per instance, so cached profiles never outlive memory_profiles
+        self._profile_for = lru_cache(maxsize=32)(self._build_profile)
+
+    @property
+    def system_info(self) -> Dict[str, Any]:
+        """System resources; free RAM and disk are refreshed at most once a second"""
+        now = time.monotonic()
+        if now >= self._system_info_expires:
+            self._system_info = self._detect_system_capabilities()
+            self._system_info_expires = now + _DYNAMIC_TTL
+        return self._system_info
 
     def _detect_system_capabilities(self) -> Dict[str, Any]:
         """Detect all available system resources"""
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage("/")
+        global _STATIC_SYS_INFO
+        system_info = self._detect_dynamic_capabilities()
+        if _STATIC_SYS_INFO is None:
+            _STATIC_SYS_INFO = self._detect_static_capabilities(system_info)
+        system_info.update(_STATIC_SYS_INFO)
+        return system_info
 
+    def _detect_dynamic_capabilities(self) -> Dict[str, Any]:
+        """Resources that change while running"""
+        return {
+            "available_ram_gb": psutil.virtual_memory().available / (1024**3),
+            "available_disk_gb": psutil.disk_usage("/").free / (1024**3),
+        }
+
+    def _detect_static_capabilities(
+        self, dynamic_info: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Resources fixed for the life of the process"""
         # More robust platform detection
         import platform
 
-        return {
-            "total_ram_gb": memory.total / (1024**3),
-            "available_ram_gb": memory.available / (1024**3),
-            "total_disk_gb": disk.total / (1024**3),
-            "available_disk_gb": disk.free / (1024**3),
+        static_info = {
+            "total_ram_gb": psutil.virtual_memory().total / (1024**3),
+            "total_disk_gb": psutil.disk_usage("/").total / (1024**3),
             "cpu_cores": psutil.cpu_count(),
+            "usable_cores": self._usable_cores(),
             "platform": platform.system(),  # Works across Python versions
             "architecture": platform.machine(),  # More reliable
         }
+        # GPU probes spawn tools like nvidia-smi, so they run once per process
+        static_info["available_vram_gb"] = self._detect_gpu_capabilities(
+            {**dynamic_info, **static_info}
+        )
+        return static_info
+
+    def _detect_gpu_capabilities(self, system_info: Dict[str, Any]) -> float:
+        """Free GPU memory in GB (0 when no usable GPU is found)"""
+        # NVIDIA via NVML bindings, if installed
+        try:
+            import pynvml
+
+            pynvml.nvmlInit()
+            try:
+                free_bytes = sum(
+                    pynvml.nvmlDeviceGetMemoryInfo(
+                        pynvml.nvmlDeviceGetHandleByIndex(i)
+                    ).free
+                    for i in range(pynvml.nvmlDeviceGetCount())
+                )
+            finally:
+                pynvml.nvmlShutdown()
+            return free_bytes / (1024**3)
+        except Exception:
+            pass
+
+        # NVIDIA via nvidia-smi (MiB per GPU, one per line)
+        try:
+            result = subprocess.run(
+                [
+                    "nvidia-smi",
+                    "--query-gpu=memory.free",
+                    "--format=csv,noheader,nounits",
+                ],
+                capture_output=True,
+                text=True,
+                timeout=10,
+            )
+            if result.returncode == 0 and result.stdout.strip():
+                return sum(float(v) for v in result.stdout.split()) / 1024
+        except (OSError, ValueError, subprocess.SubprocessError):
+            pass
+
+        if system_info["platform"] == "Darwin":
+            # Apple Silicon: Metal shares system RAM (~70% usable by the GPU)
+            if system_info["architecture"] == "arm64":
+                return system_info["available_ram_gb"] * 0.7
+
+            # Intel Macs: discrete VRAM reported by system_profiler
+            try:
+                result = subprocess.run(
+                    ["system_profiler", "SPDisplaysDataType"],
+                    capture_output=True,
+                    text=True,
+                    timeout=10,
+                )
+                vram_gb = 0.0
+                for amount, unit in re.findall(
+                    r"VRAM[^:]*:\s*([\d.]+)\s*(GB|MB)", result.stdout
+                ):
+                    vram_gb += float(amount) / (1024 if unit == "MB" else 1)
+                return vram_gb
+            except (OSError, ValueError, subprocess.SubprocessError):
+                pass
+
+        return 0.0
+
+    def _usable_cores(self) -> int:
+        """Cores this process may run on (respects taskset/cgroup affinity)"""
+        try:
+            return len(os.sched_getaffinity(0))
+        except AttributeError:  # Not available on macOS/Windows
+            return os.cpu_count() or 1
 
     def _define_memory_profiles(self) -> Dict[str, Dict]:
         """Define escalating memory management strategies"""
@@ -40,8 +149,12 @@ class UniversalMemoryManager:
                 "description": "Model fits in RAM - direct loading",
                 "ram_usage_ratio": 0.8,  # Use up to 80% of available RAM
                 "context_size": 8192,
-                "batch_size": 512,
+                "batch_size": 2048,
+                "ubatch_size": 512,
                 "gpu_layers": -1,  # All layers
+                "kv_offload": True,
+                "kv_type_k": "f16",
+                "kv_type_v": "f16",
                 "mmap": False,
                 "streaming": False,
             },
@@ -49,8 +162,12 @@ class UniversalMemoryManager:
                 "description": "Light memory mapping - model 1-3x RAM",
                 "ram_usage_ratio": 0.9,
                 "context_size": 4096,
-                "batch_size": 256,
+                "batch_size": 1024,
+                "ubatch_size": 512,
                 "gpu_layers": "auto",
+                "kv_offload": True,
+                "kv_type_k": "f16",
+                "kv_type_v": "f16",
                 "mmap": True,
                 "streaming": False,
             },
@@ -59,7 +176,11 @@ class UniversalMemoryManager:
                 "ram_usage_ratio": 0.95,
                 "context_size": 2048,
                 "batch_size": 128,
+                "ubatch_size": 128,
                 "gpu_layers": "minimal",
+                "kv_offload": True,
+                "kv_type_k": "q8_0",  # Half the KV bytes moved per token
+                "kv_type_v": "q8_0",
                 "mmap": True,
                 "streaming": True,
             },
@@ -68,17 +189,28 @@ class UniversalMemoryManager:
                 "ram_usage_ratio": 0.5,  # Only use half of RAM
                 "context_size": 1024,
                 "batch_size": 32,
+                "ubatch_size": 32,
                 "gpu_layers": 0,  # CPU only
+                "kv_offload": False,
+                "kv_type_k": "q8_0",
+                "kv_type_v": "q8_0",
                 "mmap": True,
                 "streaming": True,
                 "sequential_loading": True,
             },
         }
 
-    def select_optimal_profile(self, model_size_gb: float) -> Tuple[str, Dict]:
-        """Automatically select the best profile for model size"""
-        available_ram = self.system_info["available_ram_gb"]
+    def select_optimal_profile(self, model_size_gb: float) -> Tuple[str, Mapping]:
+        """Automatically select the best profile for model size (read-only result)"""
+        # 0.1GB resolution: RAM readings jitter, the chosen profile doesn't
+        return self._profile_for(
+            round(model_size_gb, 1), round(self.system_info["available_ram_gb"], 1)
+        )
 
+    def _build_profile(
+        self, model_size_gb: float, available_ram: float
+    ) -> Tuple[str, Mapping]:
+        """Select and adjust a profile for one (model size, free RAM) pair"""
         # Calculate size ratios
         size_ratio = model_size_gb / available_ram
 
@@ -92,6 +224,8 @@ class UniversalMemoryManager:
             profile = "ultra_conservative"
 
         selected_profile = self.memory_profiles[profile].copy()
+        # Carried along so estimate_performance doesn't recompute it
+        selected_profile["size_ratio"] = size_ratio
 
         # Dynamic adjustments based on actual ratio
         if size_ratio > 5:
@@ -107,7 +241,12 @@ class UniversalMemoryManager:
             selected_profile["batch_size"] = 8
             selected_profile["sequential_loading"] = True
 
-        return profile, selected_profile
+        # A compute pass can't be larger than the logical batch
+        selected_profile["ubatch_size"] = min(
+            selected_profile["ubatch_size"], selected_profile["batch_size"]
+        )
+
+        return profile, MappingProxyType(selected_profile)
 
     def calculate_gpu_layers(
         self, total_layers: int, profile: Dict, model_size_gb: float
@@ -118,10 +257,10 @@ class UniversalMemoryManager:
         if gpu_layers_setting == -1:
             return total_layers  # All layers
         elif gpu_layers_setting == "auto":
-            # Estimate layers that fit in GPU memory
-            available_gpu_memory = (
-                self.system_info["available_ram_gb"] * 0.7
-            )  # Conservative
+            # Estimate layers that fit in free GPU memory (10% headroom)
+            available_gpu_memory = self.system_info["available_vram_gb"] * 0.9
+            if available_gpu_memory <= 0 or model_size_gb <= 0:
+                return 0
             layers_per_gb = total_layers / model_size_gb
             max_gpu_layers = int(available_gpu_memory * layers_per_gb)
             return min(max_gpu_layers, total_layers)
@@ -131,10 +270,13 @@ class UniversalMemoryManager:
             return int(gpu_layers_setting)
 
     def estimate_performance(
-        self, model_size_gb: float, profile: Dict
+        self, model_size_gb: float, profile: Mapping, size_ratio: Optional[float] = None
     ) -> Dict[str, Any]:
         """Estimate performance characteristics"""
-        size_ratio = model_size_gb / self.system_info["available_ram_gb"]
+        if size_ratio is None:
+            size_ratio = profile.get("size_ratio")
+        if size_ratio is None:
+            size_ratio = model_size_gb / self.system_info["available_ram_gb"]
 
         # Base performance metrics
         base_tokens_per_second = 50  # Optimistic baseline
@@ -1,64 +1,92 @@
 # utils/fortress_protection.py
-from pre_flight_checker import PreFlightChecker
-from system_limits import SystemLimits
-from system_circuit_breaker import SystemCircuitBreaker
-from memory_guardian import EnhancedMemoryGuardian
+from contextlib import contextmanager
+from functools import cached_property
 from typing import Callable
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 
 class FortressProtection:
     """Multi-layer defense system for hardware protection"""
 
     def __init__(self, max_memory_gb: float = 20.0):
         self.max_memory_gb = max_memory_gb
-        self.pre_flight = PreFlightChecker()
-        self.system_limits = SystemLimits()
-        self.circuit_breaker = SystemCircuitBreaker()
-        self.memory_guardian = EnhancedMemoryGuardian(max_memory_gb=max_memory_gb)
 
-    def fortified_execution(
-        self, target_function: Callable, model_size_gb: float = 0, *args, **kwargs
-    ):
-        """Execute function with all protection layers"""
+    # Layers are imported and built on first use, so importing this module
+    # (or creating a FortressProtection that is never used) stays cheap
+    @cached_property
+    def pre_flight(self):
+        from pre_flight_checker import PreFlightChecker
+
+        return PreFlightChecker()
+
+    @cached_property
+    def system_limits(self):
+        from system_limits import SystemLimits
+
+        return SystemLimits()
+
+    @cached_property
+    def circuit_breaker(self):
+        from system_circuit_breaker import SystemCircuitBreaker
 
-        print("🏰 Activating Fortress Protection...")
+        return SystemCircuitBreaker()
+
+    @cached_property
+    def memory_guardian(self):
+        from memory_guardian import EnhancedMemoryGuardian
+
+        return EnhancedMemoryGuardian(max_memory_gb=self.max_memory_gb)
+
+    @contextmanager
+    def protected(self, model_size_gb: float = 0):
+        """Context manager applying all protection layers to the enclosed block"""
+
+        logger.info("🏰 Activating Fortress Protection...")
 
         # LAYER 1: Pre-flight Safety Check
         if model_size_gb > 0:
             safe, message, details = self.pre_flight.can_run_safely(model_size_gb)
-            print(f"Layer 1 - Pre-flight: {message}")
+            logger.info("Layer 1 - Pre-flight: %s", message)
 
             if not safe:
                 raise RuntimeError(f"Pre-flight check failed: {message}")
 
         try:
             # LAYER 2: System-Level Limits
-            print("Layer 2 - Setting system limits...")
+            logger.info("Layer 2 - Setting system limits...")
             self.system_limits.set_memory_limit(self.max_memory_gb)
             self.system_limits.set_process_limits(50)
             self.system_limits.set_cpu_limit(7200)  # 2 hours max
 
             # LAYER 3: System Circuit Breaker
-            print("Layer 3 - Activating circuit breaker...")
+            logger.info("Layer 3 - Activating circuit breaker...")
             self.circuit_breaker.register_process(os.getpid())
-            self.circuit_breaker.start_system_monitoring()
+            # Checked from the memory guardian's thread (layer 4)
+            self.circuit_breaker.start_system_monitoring(spawn_thread=False)
 
             # LAYER 4: Memory Guardian
-            print("Layer 4 - Memory guardian protection...")
-            result = self.memory_guardian.protect_process(
-                target_function, *args, **kwargs
-            )
+            logger.info("Layer 4 - Memory guardian protection...")
+            with self.memory_guardian.protect(self.circuit_breaker):
+                yield self
 
-            print("🎉 Function completed successfully with full protection")
-            return result
+            logger.info("🎉 Function completed successfully with full protection")
 
         except Exception as e:
-            print(f"🚨 Protected function failed: {e}")
+            logger.error("🚨 Protected function failed: %s", e)
             raise
         finally:
             # Cleanup all layers
-            print("🧹 Cleaning up protection layers...")
+            logger.info("🧹 Cleaning up protection layers...")
             self.circuit_breaker.stop_system_monitoring()
             self.system_limits.restore_limits()
-            print("🏰 Fortress Protection deactivated")
+            logger.info("🏰 Fortress Protection deactivated")
+
+    def fortified_execution(
+        self, target_function: Callable, model_size_gb: float = 0, *args, **kwargs
+    ):
+        """Execute function with all protection layers"""
+        with self.protected(model_size_gb):
+            return target_function(*args, **kwargs)
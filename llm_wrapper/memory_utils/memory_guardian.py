@@ -1,13 +1,86 @@
+import faulthandler
 import psutil
+import select
 import signal
 import os
+import sys
 import threading
 import time
 import logging
-from typing import Optional, Callable
+from typing import Optional, Callable, Dict, List, Set, Tuple
 from contextlib import contextmanager
 from system_circuit_breaker import SystemCircuitBreaker
 from system_limits import SystemLimits
+from proc_scan import PpidScanner, RssReader, descendants
+
+
+def _cgroup_memory_limit() -> Optional[Tuple[str, int]]:
+    """(cgroup v2 directory, tightest limit in bytes) for this process, if limited"""
+    try:
+        with open("/proc/self/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    cgroup_dir = "/sys/fs/cgroup" + line[3:].strip()
+                    break
+            else:
+                return None  # cgroup v1 or not Linux
+
+        limits = []
+        for name in ("memory.high", "memory.max"):
+            with open(os.path.join(cgroup_dir, name)) as f:
+                value = f.read().strip()
+            if value != "max":
+                limits.append(int(value))
+    except (OSError, ValueError):
+        return None
+
+    # Without a limit the kernel never raises high/max/oom events
+    if not limits:
+        return None
+    return cgroup_dir, min(limits)
+
+
+def _read_memory_events(events_file) -> Dict[str, int]:
+    """Parse memory.events counters (reading also re-arms the poll)"""
+    events_file.seek(0)
+    counters = {}
+    for line in events_file.read().splitlines():
+        key, _, value = line.partition(" ")
+        counters[key] = int(value)
+    return counters
+
+
+def _open_wake_fds() -> Tuple[int, int]:
+    """(read fd, write fd) for waking a poll(); one eventfd serves as both"""
+    if hasattr(os, "eventfd"):
+        fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        return fd, fd
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    os.set_blocking(write_fd, False)
+    return read_fd, write_fd
+
+
+def _signal_wake(wake_fds: Tuple[int, int]):
+    try:
+        if wake_fds[0] == wake_fds[1]:
+            os.eventfd_write(wake_fds[1], 1)
+        else:
+            os.write(wake_fds[1], b"x")
+    except BlockingIOError:
+        pass  # Already signalled and not yet drained
+
+
+def _drain_wake(wake_fds: Tuple[int, int]):
+    """Reset the wake fd so the next poll() blocks again"""
+    try:
+        if wake_fds[0] == wake_fds[1]:
+            os.eventfd_read(wake_fds[0])
+        else:
+            while os.read(wake_fds[0], 512):
+                pass
+    except BlockingIOError:
+        pass
 
 
 class MemoryGuardian:
@@ -17,15 +90,50 @@ class MemoryGuardian:
         check_interval: float = 0.5,
         grace_period: float = 3.0,
         logger: Optional[logging.Logger] = None,
+        adaptive: bool = True,
+        max_check_interval: float = 1.0,
     ):
         self.max_memory_bytes = max_memory_gb * 1024**3
         self.check_interval = check_interval
+        # Adaptive sampling: back off towards max_check_interval while usage
+        # is low and stable, drop back to check_interval as soon as it moves
+        self.adaptive = adaptive
+        self.max_check_interval = max(max_check_interval, check_interval)
+        self._interval = check_interval
         self.grace_period = grace_period
         self.logger = logger or self._setup_logger()
         self.monitoring = False
         self.monitor_thread = None
         self.emergency_triggered = False
-        self._shutdown_event = threading.Event()
+        # Wakes the monitor's poll() on stop: an eventfd on Linux, else a pipe
+        self._wake_fds = _open_wake_fds()
+        # Child processes are rediscovered every N checks; a full /proc walk
+        # on every tick costs more than the memory reads themselves
+        self.children_refresh_cycles = 10
+        self._children: Set[psutil.Process] = set()
+        # Linux tracks bare PIDs instead: RssReader's open statm fds already
+        # detect exit and PID reuse, so no psutil.Process is needed per child
+        self._child_pids: Set[int] = set()
+        self._cycles_since_refresh = 0
+        # With no children at the last scan (the usual single-process case),
+        # rescan on this slower clock instead of every few ticks
+        self.childless_recheck_ns = 10_000_000_000
+        self._last_child_check_ns = 0
+        # Linux: our own /proc scan with stat fds kept open between refreshes
+        self._ppid_scanner = PpidScanner() if psutil.LINUX else None
+        self._rss_reader = RssReader() if psutil.LINUX else None
+        # With a cgroup memory limit the kernel tells us about pressure, so
+        # the psutil check only needs to run as a slow backstop
+        self.event_backstop_interval = 5.0
+        # A SystemCircuitBreaker whose checks ride along on our monitor
+        # thread instead of running a second polling thread
+        self._circuit_breaker: Optional[SystemCircuitBreaker] = None
+
+    def __del__(self):
+        wake_fds = getattr(self, "_wake_fds", None)
+        if wake_fds:
+            for fd in set(wake_fds):
+                os.close(fd)
 
     def _setup_logger(self):
         """Setup basic logging"""
@@ -41,12 +149,12 @@ class MemoryGuardian:
         return logger
 
     @contextmanager
-    def protect(self):
+    def protect(self, circuit_breaker: Optional[SystemCircuitBreaker] = None):
         """Context manager for memory protection"""
         self.logger.info(
             f"🛡️  Memory protection active: {self.max_memory_bytes / 1024**3:.1f}GB limit"
         )
-        self.start_monitoring()
+        self.start_monitoring(circuit_breaker)
         try:
             yield self
         except Exception as e:
@@ -93,15 +201,23 @@ class MemoryGuardian:
 
         return wrapper
 
-    def start_monitoring(self):
-        """Start memory monitoring in background thread - ENHANCED"""
+    def start_monitoring(
+        self, circuit_breaker: Optional[SystemCircuitBreaker] = None
+    ):
+        """
+        Start memory monitoring in background thread - ENHANCED.
+        A circuit breaker started with spawn_thread=False is checked on the
+        same thread, every tick.
+        """
         if self.monitoring:
             self.logger.warning("Monitoring already active")
             return
 
         self.monitoring = True
+        self._circuit_breaker = circuit_breaker
         self.emergency_triggered = False
-        self._shutdown_event.clear()
+        _drain_wake(self._wake_fds)
+        self._refresh_children(psutil.Process())
 
         self.monitor_thread = threading.Thread(
             target=self._monitor_memory, daemon=True, name="MemoryGuardian"
@@ -115,45 +231,119 @@ class MemoryGuardian:
             return
 
         self.monitoring = False
-        self._shutdown_event.set()
+        _signal_wake(self._wake_fds)  # Interrupt the monitor's poll() at once
 
         if self.monitor_thread and self.monitor_thread.is_alive():
             self.monitor_thread.join(timeout=2.0)
             if self.monitor_thread.is_alive():
                 self.logger.warning("Monitor thread didn't stop cleanly")
 
+        # Only once the monitor can no longer be mid-scan
+        if self._ppid_scanner is not None and not (
+            self.monitor_thread and self.monitor_thread.is_alive()
+        ):
+            self._ppid_scanner.close()
+            self._rss_reader.close()
+        self._circuit_breaker = None
+
         self.logger.info("Memory monitoring stopped")
 
     def _monitor_memory(self):
         """Monitor memory usage and kill if exceeded - ENHANCED"""
         current_process = psutil.Process()
+        poller = select.poll()
+        poller.register(self._wake_fds[0], select.POLLIN)
+        events = self._open_memory_events(poller)
+
+        try:
+            self._monitor_loop(current_process, poller, events)
+        finally:
+            if events:
+                events[0].close()
+
+    def _open_memory_events(self, poller):
+        """Set up kernel notification on cgroup memory.events, if usable"""
+        cgroup = _cgroup_memory_limit()
+        # Events only cover our threshold if the cgroup limit is at least as tight
+        if cgroup is None or cgroup[1] > self.max_memory_bytes:
+            return None
+
+        try:
+            events_file = open(os.path.join(cgroup[0], "memory.events"))
+            counters = _read_memory_events(events_file)
+        except (OSError, ValueError):
+            return None
+
+        # cgroup files signal changes as POLLPRI (kernfs "file modified")
+        poller.register(events_file.fileno(), select.POLLPRI | select.POLLERR)
+        self.logger.info(f"Using cgroup memory events from {cgroup[0]}")
+        return events_file, counters
+
+    def _wait_for_next_check(self, poller, events, urgent: bool) -> bool:
+        """Sleep until the next check; returns False when the cgroup hit its limit"""
+        if events is None:
+            timeout = self._interval
+        else:
+            # Confirming a violation needs the normal cadence, not the backstop
+            timeout = self.check_interval if urgent else self.event_backstop_interval
+        if self._circuit_breaker is not None:
+            # The breaker counts consecutive ticks, so it sets the pace
+            timeout = min(timeout, self._circuit_breaker.check_interval)
+        ready = poller.poll(timeout * 1000)
+        if events is None:
+            return True
+
+        events_file, counters = events
+        if not any(fd == events_file.fileno() for fd, _ in ready):
+            return True  # Backstop timeout or shutdown
+
+        latest = _read_memory_events(events_file)
+        hit_limit = any(
+            latest.get(key, 0) > counters.get(key, 0) for key in ("max", "oom")
+        )
+        counters.update(latest)
+        return not hit_limit
+
+    def _monitor_loop(self, current_process, poller, events):
+        """Run memory checks until stopped or the limit is exceeded"""
         warning_issued = False
         consecutive_violations = 0
-
-        while self.monitoring and not self._shutdown_event.is_set():
+        previous_memory = None
+        self._interval = self.check_interval
+        # Integer byte thresholds, fixed for this run; GB values are only
+        # formatted when a message is actually logged
+        warn_threshold = int(self.max_memory_bytes * 0.8)
+        kill_threshold = int(self.max_memory_bytes)
+        limit_gb = self.max_memory_bytes / 1024**3
+
+        while self.monitoring:
             try:
                 total_memory = self._get_total_memory_usage(current_process)
-                memory_gb = total_memory / 1024**3
+                if self.adaptive:
+                    self._adapt_interval(total_memory, previous_memory)
+                previous_memory = total_memory
 
                 # Warning at 80% of limit
-                if not warning_issued and total_memory > (self.max_memory_bytes * 0.8):
+                if not warning_issued and total_memory > warn_threshold:
                     self.logger.warning(
-                        f"Memory warning: {memory_gb:.1f}GB used (80% of {self.max_memory_bytes/1024**3:.1f}GB limit)"
+                        f"Memory warning: {total_memory / 1024**3:.1f}GB used (80% of {limit_gb:.1f}GB limit)"
                     )
                     warning_issued = True
 
                 # Kill at 100% of limit
-                if total_memory > self.max_memory_bytes:
+                if total_memory > kill_threshold:
                     consecutive_violations += 1
 
                     if consecutive_violations >= 2:  # Confirm it's not a spike
                         self.logger.critical(
-                            f"MEMORY LIMIT EXCEEDED: {memory_gb:.1f}GB > {self.max_memory_bytes/1024**3:.1f}GB"
+                            f"MEMORY LIMIT EXCEEDED: {total_memory / 1024**3:.1f}GB > {limit_gb:.1f}GB"
                         )
                         self.logger.critical(
                             "Terminating process to prevent system crash..."
                         )
-                        self._emergency_shutdown(current_process)
+                        self._emergency_shutdown(
+                            current_process, self._children_snapshot(current_process)
+                        )
                         break
                 else:
                     consecutive_violations = 0
@@ -164,31 +354,110 @@ class MemoryGuardian:
             except Exception as e:
                 self.logger.error(f"Unexpected monitoring error: {e}")
 
-            time.sleep(self.check_interval)
+            if self._circuit_breaker is not None and self._circuit_breaker.check_once():
+                self._circuit_breaker = None  # Triggered; it has done its job
+
+            if not self._wait_for_next_check(
+                poller, events, consecutive_violations > 0
+            ):
+                self.logger.critical(
+                    "CGROUP MEMORY LIMIT REACHED: terminating to prevent OOM kill..."
+                )
+                self._emergency_shutdown(
+                    current_process, self._children_snapshot(current_process)
+                )
+                break
+
+    def _adapt_interval(self, total_memory: int, previous_memory: Optional[int]):
+        """Double the sleep while usage is stable and under half the limit"""
+        if previous_memory is None:
+            return
+        # Change since the last check, as a fraction of the limit
+        delta = abs(total_memory - previous_memory) / self.max_memory_bytes
+        if delta < 0.01 and total_memory < self.max_memory_bytes * 0.5:
+            self._interval = min(self._interval * 2, self.max_check_interval)
+        else:
+            self._interval = self.check_interval
+
+    def _refresh_children(self, process):
+        """Rediscover all descendants of process from one /proc snapshot"""
+        self._cycles_since_refresh = 0
+        self._last_child_check_ns = time.monotonic_ns()
+        if self._ppid_scanner is not None:
+            ppid_map = self._ppid_scanner.ppid_map
+        else:
+            ppid_map = getattr(psutil._psplatform, "ppid_map", None)
+        if ppid_map is None:
+            # Platforms without a bulk parent map
+            try:
+                self._children = set(process.children(recursive=True))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self._children = set()
+            return
+
+        child_pids = descendants(ppid_map(), process.pid)
+        if self._rss_reader is not None:
+            self._child_pids = child_pids
+            self._rss_reader.retain(child_pids)
+            return
+
+        # Reuse Process objects from the last refresh (they keep psutil's
+        # per-process caches); is_running() also rejects reused PIDs
+        known = {child.pid: child for child in self._children}
+        children = set()
+        for pid in child_pids:
+            child = known.get(pid)
+            try:
+                if child is None or not child.is_running():
+                    child = psutil.Process(pid)
+                children.add(child)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        self._children = children
 
     def _get_total_memory_usage(self, process):
         """Get total memory usage including children - ENHANCED"""
         try:
-            total_memory = process.memory_info().rss
+            total_memory = None
+            if self._rss_reader is not None:
+                total_memory = self._rss_reader.rss(process.pid)
+            if total_memory is None:
+                with process.oneshot():
+                    total_memory = process.memory_info().rss
 
             # Handle children processes
-            try:
-                children = process.children(recursive=True)
-                for child in children:
-                    try:
-                        if (
-                            child.is_running()
-                            and child.status() != psutil.STATUS_ZOMBIE
-                        ):
-                            total_memory += child.memory_info().rss
-                    except (
-                        psutil.NoSuchProcess,
-                        psutil.AccessDenied,
-                        psutil.ZombieProcess,
-                    ):
-                        continue
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
+            has_children = bool(self._children or self._child_pids)
+            self._cycles_since_refresh += 1
+            if self._cycles_since_refresh >= self.children_refresh_cycles and (
+                has_children
+                or time.monotonic_ns() - self._last_child_check_ns
+                >= self.childless_recheck_ns
+            ):
+                self._refresh_children(process)
+                has_children = bool(self._children or self._child_pids)
+
+            if not has_children:
+                return total_memory  # Single process: nothing more to read
+
+            if self._rss_reader is not None:
+                # One pread per child on an already-open statm file
+                for pid in list(self._child_pids):
+                    rss = self._rss_reader.rss(pid)
+                    if rss is None:
+                        self._child_pids.discard(pid)
+                    else:
+                        total_memory += rss
+                return total_memory
+
+            for child in list(self._children):
+                # EAFP: exited and zombie children raise instead of being
+                # checked first (ZombieProcess subclasses NoSuchProcess)
+                try:
+                    total_memory += child.memory_info().rss
+                except psutil.NoSuchProcess:
+                    self._children.discard(child)
+                except psutil.AccessDenied:
+                    continue
 
             return total_memory
 
@@ -196,19 +465,41 @@ class MemoryGuardian:
             self.logger.error(f"Memory calculation error: {e}")
             return 0
 
-    def _emergency_shutdown(self, process):
+    def _children_snapshot(self, process) -> List[psutil.Process]:
+        """Current descendants as Process objects, from one fresh /proc scan"""
+        self._refresh_children(process)
+        if self._rss_reader is None:
+            return list(self._children)
+
+        children = []
+        for pid in self._child_pids:
+            try:
+                children.append(psutil.Process(pid))
+            except psutil.NoSuchProcess:
+                continue
+        return children
+
+    def _emergency_shutdown(
+        self, process, cached_children: Optional[List[psutil.Process]] = None
+    ):
         """Emergency shutdown of process and children - ENHANCED"""
         if self.emergency_triggered:
             return  # Prevent recursive calls
 
         self.emergency_triggered = True
         killed_processes = []
+        # Enumerated once; both passes below work from the same list
+        if cached_children is None:
+            try:
+                cached_children = process.children(recursive=True)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                cached_children = []
 
         try:
             # Step 1: Graceful termination (SIGTERM)
             self.logger.info("Step 1: Attempting graceful shutdown...")
             try:
-                for child in process.children(recursive=True):
+                for child in cached_children:
                     try:
                         child.terminate()  # SIGTERM
                         killed_processes.append(child.pid)
@@ -227,8 +518,10 @@ class MemoryGuardian:
             # Step 3: Force kill (SIGKILL)
             self.logger.info("Step 2: Force killing remaining processes...")
             try:
-                for child in process.children(recursive=True):
+                for child in cached_children:
                     try:
+                        # grace_period has passed; is_running() also
+                        # rejects PIDs recycled in the meantime
                         if child.is_running():
                             child.kill()  # SIGKILL
                             self.logger.info(f"Force killed child process: {child.pid}")
@@ -270,12 +563,42 @@ class EnhancedMemoryGuardian(MemoryGuardian):
 
             # Register with circuit breaker
             self.system_circuit_breaker.register_process(os.getpid())
-            self.system_circuit_breaker.start_system_monitoring()
 
-            # Run original protection
-            return super().protect_process(target_function, *args, **kwargs)
+            # On Linux RLIMIT_AS makes the kernel refuse allocations past the
+            # limit (children inherit the same cap), so no polling is needed
+            if sys.platform.startswith("linux"):
+                self.system_circuit_breaker.start_system_monitoring()
+                return self._run_with_rlimit(target_function, *args, **kwargs)
+
+            # Run original protection, with one thread doing both checks
+            self.system_circuit_breaker.start_system_monitoring(spawn_thread=False)
+            with self.protect(self.system_circuit_breaker):
+                return target_function(*args, **kwargs)
 
         finally:
             # Cleanup
             self.system_circuit_breaker.stop_system_monitoring()
             self.system_limits.restore_limits()
+
+    def _run_with_rlimit(self, target_function: Callable, *args, **kwargs):
+        """Run under the address-space limit alone, reacting to failed allocations"""
+        self.logger.info(
+            f"🛡️  Memory protection active: {self.max_memory_bytes / 1024**3:.1f}GB "
+            "address-space limit"
+        )
+        # Crashes from allocations that can't raise MemoryError still get a trace
+        if not faulthandler.is_enabled():
+            faulthandler.enable()
+
+        try:
+            return target_function(*args, **kwargs)
+        except MemoryError:
+            self.logger.critical(
+                "MEMORY LIMIT EXCEEDED: allocation refused by RLIMIT_AS"
+            )
+            self.logger.critical("Terminating process to prevent system crash...")
+            self._emergency_shutdown(psutil.Process())
+            raise
+        except Exception as e:
+            self.logger.error(f"Protected function failed: {e}")
+            raise
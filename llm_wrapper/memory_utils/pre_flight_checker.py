@@ -1,11 +1,31 @@
 # utils/pre_flight_checker.py
+import functools
+import platform
 import psutil
-import subprocess
 from typing import Tuple, Dict, Any
 from system_circuit_breaker import SystemCircuitBreaker
 from system_limits import SystemLimits
 
 
+@functools.lru_cache(maxsize=1)
+def _get_gpu_memory(total_ram_gb: float) -> float:
+    """Get GPU memory info (macOS Metal)"""
+    # For macOS M-series chips, GPU memory is unified - rough estimate that
+    # needs no system_profiler run
+    if platform.system() == "Darwin" and platform.machine() == "arm64":
+        return total_ram_gb * 0.7
+    return 0
+
+
+@functools.lru_cache(maxsize=128)
+def _estimate_bytes(model_gb_tenths: int, context_size: int, batch_size: int) -> int:
+    """Estimated memory need in bytes for a model size given in tenths of a GB"""
+    model = model_gb_tenths * 1024**3 // 10
+    context = context_size * batch_size * 4  # 4 bytes per token
+    overhead = 2 * 1024**3  # OS and other processes
+    return model + context + overhead
+
+
 class PreFlightChecker:
     def __init__(self):
         self.system_info = self._get_system_info()
@@ -14,12 +34,13 @@ class PreFlightChecker:
         """Get comprehensive system information"""
         memory = psutil.virtual_memory()
         swap = psutil.swap_memory()
+        total_ram_gb = memory.total / 1024**3
 
         # Check GPU memory if available
-        gpu_memory = self._get_gpu_memory()
+        gpu_memory = _get_gpu_memory(total_ram_gb)
 
         return {
-            "total_ram_gb": memory.total / 1024**3,
+            "total_ram_gb": total_ram_gb,
             "available_ram_gb": memory.available / 1024**3,
             "swap_total_gb": swap.total / 1024**3,
             "swap_used_gb": swap.used / 1024**3,
@@ -27,42 +48,26 @@ class PreFlightChecker:
             "cpu_cores": psutil.cpu_count(),
         }
 
-    def _get_gpu_memory(self) -> float:
-        """Get GPU memory info (macOS Metal)"""
-        try:
-            # For macOS M-series chips, GPU memory is unified
-            result = subprocess.run(
-                ["system_profiler", "SPDisplaysDataType"],
-                capture_output=True,
-                text=True,
-            )
-            # Parse output for VRAM info - simplified
-            return self.system_info.get("total_ram_gb", 0) * 0.7  # Rough estimate
-        except:
-            return 0
-
     def can_run_safely(
         self, model_size_gb: float, context_size: int = 4096, batch_size: int = 512
     ) -> Tuple[bool, str, Dict[str, Any]]:
         """Comprehensive safety check"""
 
-        # Calculate estimated memory needs
-        base_memory = model_size_gb
-        context_memory = (context_size * batch_size * 4) / 1024**3  # 4 bytes per token
-        overhead_memory = 2.0  # OS and other processes
-        total_needed = base_memory + context_memory + overhead_memory
-
+        # Calculate estimated memory needs (integer bytes, cached per preset)
+        needed_bytes = _estimate_bytes(round(model_size_gb * 10), context_size, batch_size)
+        available_bytes = int(self.system_info["available_ram_gb"] * 1024**3)
+        total_needed = needed_bytes / 1024**3
         available = self.system_info["available_ram_gb"]
 
         # Safety levels
-        if total_needed > available * 1.2:  # Would need >120% of available
+        if needed_bytes * 10 > available_bytes * 12:  # Would need >120% of available
             return (
                 False,
                 f"🚫 UNSAFE: Need {total_needed:.1f}GB, only {available:.1f}GB available",
                 {},
             )
 
-        if total_needed > available * 0.9:  # Would use >90% of available
+        if needed_bytes * 10 > available_bytes * 9:  # Would use >90% of available
             return (
                 True,
                 f"⚠️  RISKY: Will use {total_needed:.1f}GB of {available:.1f}GB",
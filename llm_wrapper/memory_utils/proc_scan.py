@@ -0,0 +1,162 @@
+# utils/proc_scan.py
+import os
+from typing import Dict, List, Optional, Set
+
+PROC = "/proc"
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def pid_list() -> List[int]:
+    """All PIDs from one /proc directory scan"""
+    # scandir reads /proc in large getdents64 batches and skips per-entry stat
+    with os.scandir(PROC) as entries:
+        return [int(entry.name) for entry in entries if entry.name.isdigit()]
+
+
+def read_rss(statm_fd: int) -> int:
+    """RSS in bytes from an open /proc/<pid>/statm descriptor"""
+    # statm: "size resident shared ..." in pages. A bounded split benchmarks
+    # faster than byte-by-byte scanning in CPython
+    return int(os.pread(statm_fd, 128, 0).split(b" ", 2)[1]) * PAGE_SIZE
+
+
+def read_meminfo_fields(meminfo_fd: int, *keys: bytes) -> List[int]:
+    """Values in bytes for the given /proc/meminfo keys (e.g. b"MemAvailable")"""
+    data = os.pread(meminfo_fd, 8192, 0)
+    values = []
+    for key in keys:
+        start = data.index(key + b":") + len(key) + 1
+        values.append(int(data[start : data.index(b"kB", start)]) * 1024)
+    return values
+
+
+def parse_ppid(stat: bytes) -> int:
+    """Parent PID from /proc/<pid>/stat contents"""
+    # comm (field 2) may contain spaces and ')' - fields resume after the last ')'
+    fields = stat[stat.rindex(b")") + 2 :].split(b" ", 2)
+    return int(fields[1])
+
+
+def descendants(ppid_map: Dict[int, int], root_pid: int) -> Set[int]:
+    """All PIDs below root_pid in a pid -> ppid map"""
+    # Invert pid -> ppid once, then walk down from the root
+    children_of: Dict[int, List[int]] = {}
+    for pid, ppid in ppid_map.items():
+        children_of.setdefault(ppid, []).append(pid)
+
+    found = set()
+    queue = list(children_of.get(root_pid, ()))
+    while queue:
+        pid = queue.pop()
+        if pid not in found:
+            found.add(pid)
+            queue.extend(children_of.get(pid, ()))
+    return found
+
+
+class PpidScanner:
+    """
+    Builds pid -> ppid maps from /proc, keeping stat files open between scans.
+    Linux only.
+    """
+
+    def __init__(self, max_open_files: int = 256):
+        # Persistent fds turn each rescan into a single pread per process
+        self.max_open_files = max_open_files
+        self._fds: Dict[int, int] = {}
+
+    def ppid_map(self) -> Dict[int, int]:
+        """Map every running PID to its parent PID"""
+        result = {}
+        seen = set()
+        for pid in pid_list():
+            seen.add(pid)
+            ppid = self._read_ppid(pid)
+            if ppid is not None:
+                result[pid] = ppid
+
+        # Release descriptors of processes that have exited
+        for pid in self._fds.keys() - seen:
+            self._close(pid)
+        return result
+
+    def _read_ppid(self, pid: int):
+        fd = self._fds.get(pid)
+        if fd is not None:
+            try:
+                data = os.pread(fd, 256, 0)
+                if data:
+                    return parse_ppid(data)
+            except (OSError, ValueError):
+                pass
+            # The process behind this fd is gone (the PID may be reused)
+            self._close(pid)
+
+        try:
+            fd = os.open(f"{PROC}/{pid}/stat", os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            return None  # Exited between the scan and the open
+        try:
+            data = os.pread(fd, 256, 0)
+            ppid = parse_ppid(data) if data else None
+        except (OSError, ValueError):
+            ppid = None
+
+        if ppid is not None and len(self._fds) < self.max_open_files:
+            self._fds[pid] = fd
+        else:
+            os.close(fd)
+        return ppid
+
+    def _close(self, pid: int):
+        fd = self._fds.pop(pid, None)
+        if fd is not None:
+            os.close(fd)
+
+    def close(self):
+        """Close all cached stat descriptors"""
+        for pid in list(self._fds):
+            self._close(pid)
+
+
+class RssReader:
+    """
+    Reads resident set size from /proc/<pid>/statm through cached descriptors.
+    Linux only.
+    """
+
+    def __init__(self):
+        self._fds: Dict[int, int] = {}
+
+    def rss(self, pid: int) -> Optional[int]:
+        """RSS in bytes, or None once the process has exited"""
+        fd = self._fds.get(pid)
+        if fd is None:
+            try:
+                fd = os.open(f"{PROC}/{pid}/statm", os.O_RDONLY | os.O_CLOEXEC)
+            except OSError:
+                return None
+            self._fds[pid] = fd
+
+        try:
+            return read_rss(fd)
+        except (OSError, ValueError, IndexError):
+            # An fd stays bound to the original process, so this also
+            # catches exit followed by PID reuse
+            self._close(pid)
+            return None
+
+    def retain(self, pids: Set[int]):
+        """Close descriptors for processes no longer tracked"""
+        for pid in self._fds.keys() - pids:
+            self._close(pid)
+
+    def _close(self, pid: int):
+        fd = self._fds.pop(pid, None)
+        if fd is not None:
+            os.close(fd)
+
+    def close(self):
+        """Close all cached statm descriptors"""
+        for pid in list(self._fds):
+            self._close(pid)
@@ -1,12 +1,23 @@
 # utils/system_circuit_breaker.py
+import heapq
 import psutil
 import threading
 import time
 import os
 import signal
-from typing import Callable, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 import subprocess
 
+from proc_scan import PROC, pid_list, read_meminfo_fields, read_rss
+
+
+def _pidfd_open(pid: int) -> Optional[int]:
+    """A pidfd for pid (Linux 5.3+), or None where unsupported"""
+    try:
+        return os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return None
+
 
 class SystemCircuitBreaker:
     """External process monitor - catches what Memory Guardian misses"""
@@ -23,19 +34,50 @@ class SystemCircuitBreaker:
         self.monitoring = False
         self.monitor_thread = None
         self.protected_pids = set()
+        self._protected_procs = {}
+        # Total RAM can't change at runtime; only MemAvailable is re-read
+        self._total_memory = psutil.virtual_memory().total
+        # pidfds pin the exact process, so a recycled PID is never signalled
+        self._pidfds: Dict[int, int] = {}
+        self._meminfo_fd: Optional[int] = None
+        self._consecutive_violations = 0
 
     def register_process(self, pid: int):
         """Register a process for protection"""
         self.protected_pids.add(pid)
+        if pid not in self._pidfds:
+            pidfd = _pidfd_open(pid)
+            if pidfd is not None:
+                self._pidfds[pid] = pidfd
 
-    def start_system_monitoring(self):
-        """Start system-wide monitoring"""
+    def start_system_monitoring(self, spawn_thread: bool = True):
+        """
+        Start system-wide monitoring. With spawn_thread=False no thread is
+        started and the caller's own monitor loop drives check_once().
+        """
         if self.monitoring:
             return
 
         self.monitoring = True
-        self.monitor_thread = threading.Thread(target=self._monitor_system, daemon=True)
-        self.monitor_thread.start()
+        self._consecutive_violations = 0
+        if psutil.LINUX:
+            try:
+                self._meminfo_fd = os.open("/proc/meminfo", os.O_RDONLY | os.O_CLOEXEC)
+            except OSError:
+                self._meminfo_fd = None
+        # Resolved once: the emergency path shouldn't construct Process objects,
+        # and psutil's terminate() refuses to signal a reused PID
+        self._protected_procs = {}
+        for pid in self.protected_pids:
+            try:
+                self._protected_procs[pid] = psutil.Process(pid)
+            except psutil.NoSuchProcess:
+                pass
+        if spawn_thread:
+            self.monitor_thread = threading.Thread(
+                target=self._monitor_system, daemon=True
+            )
+            self.monitor_thread.start()
         print(
             f"🔍 System circuit breaker active (Memory: {self.memory_threshold*100}%, Swap: {self.swap_threshold*100}%)"
         )
@@ -45,42 +87,69 @@ class SystemCircuitBreaker:
         self.monitoring = False
         if self.monitor_thread:
             self.monitor_thread.join(timeout=1.0)
+        if not (self.monitor_thread and self.monitor_thread.is_alive()):
+            self.monitor_thread = None
+            self._close_pidfds(list(self._pidfds))
+            if self._meminfo_fd is not None:
+                os.close(self._meminfo_fd)
+                self._meminfo_fd = None
 
     def _monitor_system(self):
         """Monitor system-wide resource usage"""
-        consecutive_violations = 0
-
         while self.monitoring:
-            try:
-                memory = psutil.virtual_memory()
-                swap = psutil.swap_memory()
+            if self.check_once():
+                break
+            time.sleep(self.check_interval)
 
-                memory_usage = 1 - (memory.available / memory.total)
-                swap_usage = swap.used / max(swap.total, 1)  # Avoid division by zero
+    def check_once(self) -> bool:
+        """One system check, meant to run every check_interval; True once triggered"""
+        if not self.monitoring:
+            return False
+
+        try:
+            memory_usage, swap_usage = self._read_usage(self._meminfo_fd)
 
-                # Check for dangerous conditions
-                dangerous = (
-                    memory_usage > self.memory_threshold
-                    or swap_usage > self.swap_threshold
+            # Check for dangerous conditions
+            dangerous = (
+                memory_usage > self.memory_threshold
+                or swap_usage > self.swap_threshold
+            )
+
+            if dangerous:
+                self._consecutive_violations += 1
+                print(
+                    f"⚠️  System under pressure: RAM {memory_usage*100:.1f}%, Swap {swap_usage*100:.1f}%"
                 )
 
-                if dangerous:
-                    consecutive_violations += 1
-                    print(
-                        f"⚠️  System under pressure: RAM {memory_usage*100:.1f}%, Swap {swap_usage*100:.1f}%"
-                    )
+                if self._consecutive_violations >= 3:  # 1.5 seconds of violations
+                    print("🚨 SYSTEM CIRCUIT BREAKER TRIGGERED")
+                    self._emergency_system_protection()
+                    return True
+            else:
+                self._consecutive_violations = 0
 
-                    if consecutive_violations >= 3:  # 1.5 seconds of violations
-                        print("🚨 SYSTEM CIRCUIT BREAKER TRIGGERED")
-                        self._emergency_system_protection()
-                        break
-                else:
-                    consecutive_violations = 0
+        except Exception as e:
+            print(f"Circuit breaker error: {e}")
 
-            except Exception as e:
-                print(f"Circuit breaker error: {e}")
+        return False
 
-            time.sleep(self.check_interval)
+    def _read_usage(self, meminfo_fd: Optional[int]) -> Tuple[float, float]:
+        """(RAM usage, swap usage) as fractions of their totals"""
+        if meminfo_fd is not None:
+            # One pread of the open file and three fields, instead of
+            # psutil parsing all of /proc/meminfo twice
+            available, swap_total, swap_free = read_meminfo_fields(
+                meminfo_fd, b"MemAvailable", b"SwapTotal", b"SwapFree"
+            )
+            swap_used = swap_total - swap_free
+        else:
+            available = psutil.virtual_memory().available
+            swap = psutil.swap_memory()
+            swap_total, swap_used = swap.total, swap.used
+
+        memory_usage = 1 - (available / self._total_memory)
+        swap_usage = swap_used / max(swap_total, 1)  # Avoid division by zero
+        return memory_usage, swap_usage
 
     def _emergency_system_protection(self):
         """Emergency system protection"""
@@ -89,32 +158,38 @@ class SystemCircuitBreaker:
         # Step 1: Kill registered processes first
         for pid in self.protected_pids.copy():
             try:
-                os.kill(pid, signal.SIGTERM)
+                if pid in self._pidfds:
+                    signal.pidfd_send_signal(self._pidfds[pid], signal.SIGTERM)
+                else:
+                    process = self._protected_procs.get(pid) or psutil.Process(pid)
+                    process.terminate()  # SIGTERM
                 print(f"Terminated registered process: {pid}")
-            except (OSError, ProcessLookupError):
+            except (psutil.NoSuchProcess, psutil.AccessDenied, OSError):
                 self.protected_pids.discard(pid)
 
         time.sleep(2)
 
         # Step 2: Kill high-memory processes
         try:
-            processes = [
-                (p.info["pid"], p.info["memory_percent"], p.info["name"])
-                for p in psutil.process_iter(["pid", "memory_percent", "name"])
-            ]
-
-            # Sort by memory usage, kill top consumers
-            high_memory_procs = sorted(processes, key=lambda x: x[1], reverse=True)[:5]
+            high_memory_procs = self._high_memory_processes(
+                limit=5, min_percent=5.0
+            )
 
             for pid, memory_pct, name in high_memory_procs:
-                if memory_pct > 5.0:  # Using more than 5% of system memory
-                    try:
+                try:
+                    if pid in self._pidfds:
+                        signal.pidfd_send_signal(self._pidfds[pid], signal.SIGKILL)
+                    else:
                         os.kill(pid, signal.SIGKILL)
-                        print(
-                            f"Emergency killed: {name} (PID: {pid}, {memory_pct:.1f}% memory)"
-                        )
-                    except (OSError, ProcessLookupError):
-                        pass
+                    print(
+                        f"Emergency killed: {name} (PID: {pid}, {memory_pct:.1f}% memory)"
+                    )
+                except (OSError, ProcessLookupError):
+                    pass
+            # Registered processes keep theirs until monitoring stops
+            self._close_pidfds(
+                [pid for pid, _, _ in high_memory_procs if pid not in self.protected_pids]
+            )
 
         except Exception as e:
             print(f"Emergency process cleanup failed: {e}")
@@ -124,3 +199,87 @@ class SystemCircuitBreaker:
             subprocess.run(["sudo", "purge"], check=False, timeout=10)
         except:
             pass
+
+    def _high_memory_processes(
+        self, limit: int, min_percent: float
+    ) -> List[Tuple[int, float, str]]:
+        """Top memory consumers above min_percent of RAM as (pid, percent, name)"""
+        total = psutil.virtual_memory().total
+        min_rss = total * min_percent / 100
+
+        if psutil.LINUX:
+            # One statm read per PID; names are only looked up for the winners
+            candidates = []
+            statm_fds = {}
+            try:
+                for pid in pid_list():
+                    try:
+                        fd = os.open(f"{PROC}/{pid}/statm", os.O_RDONLY | os.O_CLOEXEC)
+                    except OSError:
+                        continue
+                    try:
+                        rss = read_rss(fd)
+                    except (OSError, ValueError, IndexError):
+                        os.close(fd)
+                        continue
+                    if rss > min_rss:
+                        candidates.append((rss, pid))
+                        statm_fds[pid] = fd  # Still bound to the process we measured
+                    else:
+                        os.close(fd)
+
+                winners = [
+                    (rss, pid)
+                    for rss, pid in heapq.nlargest(limit, candidates)
+                    if self._pin_process(pid, statm_fds[pid])
+                ]
+            finally:
+                for fd in statm_fds.values():
+                    os.close(fd)
+
+            return [
+                (pid, rss * 100 / total, self._process_name(pid))
+                for rss, pid in winners
+            ]
+
+        # attrs are fetched in one batched pass per process; processes we
+        # may not inspect come back as 0.0 instead of raising
+        processes = [
+            (p.info["pid"], p.info["memory_percent"], p.info["name"])
+            for p in psutil.process_iter(
+                ["pid", "memory_percent", "name"], ad_value=0.0
+            )
+            if p.info["memory_percent"] > min_percent
+        ]
+        return heapq.nlargest(limit, processes, key=lambda x: x[1])
+
+    def _pin_process(self, pid: int, statm_fd: int) -> bool:
+        """Open a pidfd for pid; False if the measured process already exited"""
+        if pid in self._pidfds:
+            return True
+        pidfd = _pidfd_open(pid)
+        try:
+            # The statm fd fails once its process exits; if it still reads
+            # now, the PID can't have been recycled before the pidfd opened
+            read_rss(statm_fd)
+        except (OSError, ValueError, IndexError):
+            if pidfd is not None:
+                os.close(pidfd)
+            return False
+        if pidfd is not None:
+            self._pidfds[pid] = pidfd
+        return True
+
+    def _close_pidfds(self, pids: List[int]):
+        for pid in pids:
+            pidfd = self._pidfds.pop(pid, None)
+            if pidfd is not None:
+                os.close(pidfd)
+
+    def _process_name(self, pid: int) -> str:
+        """Command name from /proc/<pid>/comm"""
+        try:
+            with open(f"{PROC}/{pid}/comm") as f:
+                return f.read().strip()
+        except OSError:
+            return "?"
@@ -1,12 +1,11 @@
 from api.local_llm import LocalLLM
 
 
-def test_api_interface():
+def test_api_interface(llm):
     print("🧪 Testing Main API Interface\n")
 
     # Test initialization
     print("=== Initialization ===")
-    llm = LocalLLM()
     print(f"✓ Initialized successfully")
     print(f"✓ Current model: {llm.current_model()}")
     print(f"✓ Current preset: {llm.current_preset()}")
@@ -42,4 +41,4 @@ def test_api_interface():
 
 
 if __name__ == "__main__":
-    test_api_interface()
+    test_api_interface(LocalLLM())
@@ -1,13 +1,7 @@
 from core.inference_engine import InferenceEngine
 
 
-def test_basic_inference():
-    # Initialize engine
-    engine = InferenceEngine()
-
-    # Set model
-    engine.set_model("mistral-7b-base")
-
+def test_basic_inference(engine):
     # Test basic generation
     print("🧪 Testing basic generation...")
     prompt = "The quick brown fox"
@@ -26,4 +20,6 @@ def test_basic_inference():
 
 
 if __name__ == "__main__":
-    test_basic_inference()
+    engine = InferenceEngine()
+    engine.set_model("mistral-7b-base")
+    test_basic_inference(engine)
@@ -1,11 +1,9 @@
 from api.local_llm import LocalLLM
 
 
-def test_templates():
+def test_templates(llm):
     print("🧪 Testing Template Integration\n")
 
-    llm = LocalLLM()
-
     # Test template listing
     templates = llm.list_templates()
     print(f"✓ Found {len(templates)} templates")
@@ -23,11 +21,9 @@ def test_templates():
     print(f"✓ Template description: {description}")
 
 
-def test_benchmarking():
+def test_benchmarking(llm):
     print("\n🧪 Testing Benchmarking Integration\n")
 
-    llm = LocalLLM()
-
     # Test quick benchmark
     results = llm.quick_benchmark("Test prompt for benchmarking")
     print(f"✓ Quick benchmark completed")
@@ -38,6 +34,7 @@ def test_benchmarking():
 
 
 if __name__ == "__main__":
-    test_templates()
-    test_benchmarking()
+    llm = LocalLLM()  # One instance (and model load) for both tests
+    test_templates(llm)
+    test_benchmarking(llm)
     print("\n🎉 All integration tests passed!")
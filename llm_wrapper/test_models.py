@@ -1,12 +1,9 @@
 from core.inference_engine import InferenceEngine
 
 
-def test_model_management():
+def test_model_management(engine):
     print("🧪 Testing Model Management System\n")
 
-    # Initialize engine
-    engine = InferenceEngine()
-
     # Test model discovery
     print("=== Model Discovery ===")
     available_models = engine.get_available_models()
@@ -38,4 +35,4 @@ def test_model_management():
 
 
 if __name__ == "__main__":
-    test_model_management()
+    test_model_management(InferenceEngine())
@@ -1,13 +1,9 @@
 from core.inference_engine import InferenceEngine
 
 
-def test_parameter_management():
+def test_parameter_management(engine):
     print("🧪 Testing Parameter Management System\n")
 
-    # Initialize engine
-    engine = InferenceEngine()
-    engine.set_model("mistral-7b-base")
-
     # Test preset switching
     print("=== Testing Presets ===")
 
@@ -45,4 +41,6 @@ def test_parameter_management():
 
 
 if __name__ == "__main__":
-    test_parameter_management()
+    engine = InferenceEngine()
+    engine.set_model("mistral-7b-base")
+    test_parameter_management(engine)
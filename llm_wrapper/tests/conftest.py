@@ -0,0 +1,52 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+_ROOT = Path(__file__).resolve().parent.parent
+_CONFIG_DIR = _ROOT / "config"
+
+# memory_utils modules import each other as top-level modules
+sys.path.insert(0, str(_ROOT / "memory_utils"))
+
+
+@pytest.fixture
+def cli_config_dir(tmp_path):
+    """Config dir with one small model and a llama-cli but no llama-server"""
+    (tmp_path / "bin").mkdir()
+    (tmp_path / "bin" / "llama-cli").touch()
+    (tmp_path / "models").mkdir()
+    (tmp_path / "models" / "tiny.gguf").write_bytes(b"GGUF")
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+    (config_dir / "models.yaml").write_text(
+        "models:\n"
+        "  tiny:\n"
+        f"    path: \"{tmp_path / 'models' / 'tiny.gguf'}\"\n"
+        f"    executable: \"{tmp_path / 'bin' / 'llama-cli'}\"\n"
+        "    size_gb: 1\n"
+        "    status: \"active\"\n"
+    )
+    shutil.copy(_CONFIG_DIR / "parameters.yaml", config_dir / "parameters.yaml")
+    return config_dir
+
+
+@pytest.fixture
+def cli_engine(cli_config_dir):
+    """InferenceEngine on the llama-cli path with the tiny model selected"""
+    from core.inference_engine import InferenceEngine
+
+    engine = InferenceEngine(str(cli_config_dir))
+    engine.set_model("tiny")
+    return engine
+
+
+@pytest.fixture
+def cli_llm(cli_config_dir):
+    """LocalLLM over the tiny llama-cli config"""
+    from api.local_llm import LocalLLM
+
+    llm = LocalLLM(model="tiny", config_dir=str(cli_config_dir))
+    yield llm
+    llm.close()
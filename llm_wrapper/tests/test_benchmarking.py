@@ -0,0 +1,211 @@
+import json
+import logging
+import os
+import statistics
+import sys
+import types
+
+import pytest
+
+from utils.benchmarking import LLMBenchmark, RunningStats, _ResultWriter, _percentile
+
+
+class FakeLLM:
+    """Just enough of LocalLLM for LLMBenchmark; responses echo the prompt"""
+
+    def __init__(self):
+        self.engine = types.SimpleNamespace(uses_server=False, server_slots=1)
+        self.calls = []
+
+    def warmup(self):
+        self.calls.append("warmup")
+        self.engine.server_slots = 4  # As when llama-server starts
+        return self
+
+    def current_parameters(self):
+        return {"temperature": 0.8}
+
+    def current_model(self):
+        return "fake"
+
+    def generate_stream(self, prompt, **kwargs):
+        self.calls.append("generate")
+        yield from prompt  # One chunk per character
+
+    def generate_batch(self, prompts, **kwargs):
+        return list(prompts)
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 21))  # 1..20
+    assert _percentile(values, 50) == 10
+    assert _percentile(values, 95) == 19
+    assert _percentile(values, 100) == 20
+    assert _percentile(values, 0) == 1
+    assert _percentile([7.0], 95) == 7.0
+
+
+def test_running_stats_matches_statistics():
+    values = [0.5, 2.0, 1.25, 3.5, 0.75]
+    stats = RunningStats()
+    for value in values:
+        stats.push(value)
+
+    assert stats.n == len(values)
+    assert stats.total == pytest.approx(sum(values))
+    assert stats.mean == pytest.approx(statistics.mean(values))
+    assert stats.stdev == pytest.approx(statistics.stdev(values))
+    assert (stats.min, stats.max) == (min(values), max(values))
+
+
+def test_running_stats_stdev_needs_two_values():
+    stats = RunningStats()
+    assert stats.stdev == 0.0
+    stats.push(4.0)
+    assert stats.stdev == 0.0
+
+
+def test_history_is_capped_but_stats_cover_every_run():
+    benchmark = LLMBenchmark(FakeLLM(), history_cap=3)
+    benchmark.batch_time(["a", "bb", "ccc", "dddd", "eeeee"])
+
+    assert [r.prompt for r in benchmark.results] == ["ccc", "dddd", "eeeee"]
+    assert len(benchmark._durations) == len(benchmark._resp_lens) == 3
+    assert benchmark._duration_stats.n == 5
+    assert benchmark._length_stats.mean == 3.0
+
+    report = benchmark.generate_report()
+    assert "Total runs: 5" in report
+    assert "Median duration (recent runs)" in report
+
+
+def test_as_dataframe_restores_recording_order(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pandas", types.SimpleNamespace(DataFrame=dict))
+    benchmark = LLMBenchmark(FakeLLM(), history_cap=3)
+    for prompt in ["a", "bb", "ccc", "dddd", "eeeee"]:
+        benchmark.time_generation(prompt)
+
+    frame = benchmark.as_dataframe()
+    assert frame["prompt"] == ["ccc", "dddd", "eeeee"]
+    assert frame["response_length"] == [3.0, 4.0, 5.0]
+    assert frame["duration"] == [r.duration for r in benchmark.results]
+
+
+def test_uncapped_history_keeps_everything():
+    benchmark = LLMBenchmark(FakeLLM(), history_cap=None)
+    benchmark.batch_time(["a"] * 20)
+    assert len(benchmark.results) == len(benchmark._durations) == 20
+    assert "(recent runs)" not in benchmark.generate_report()
+
+
+def test_clear_results_resets_history_and_columns():
+    benchmark = LLMBenchmark(FakeLLM(), history_cap=2)
+    benchmark.batch_time(["a", "b", "c"])
+    benchmark.clear_results()
+    assert not benchmark.results and not benchmark._durations
+    assert benchmark._duration_stats.n == 0
+    assert benchmark.generate_report() == "No benchmark results available."
+
+
+def test_result_log_is_flushed_on_close(tmp_path):
+    log_path = tmp_path / "results.jsonl"
+    benchmark = LLMBenchmark(FakeLLM(), log_path=str(log_path))
+    for prompt in ["a", "b", "c"]:
+        benchmark.time_generation(prompt)
+    benchmark.batch_time(["d", "e"])
+    benchmark.close()
+    benchmark.close()  # Idempotent
+
+    rows = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [row["prompt"] for row in rows] == ["a", "b", "c", "d", "e"]
+    assert rows[0]["parameters"] == {"temperature": 0.8}
+
+
+def test_result_log_appends_across_writers(tmp_path):
+    log_path = tmp_path / "results.jsonl"
+    for prompt in ["first", "second"]:
+        benchmark = LLMBenchmark(FakeLLM(), log_path=str(log_path))
+        benchmark.time_generation(prompt)
+        benchmark.close()
+    assert len(log_path.read_text().splitlines()) == 2
+
+
+def test_result_writer_logs_write_errors(tmp_path, caplog):
+    log_path = tmp_path / "results.jsonl"
+    writer = _ResultWriter(str(log_path))
+    os.close(writer._fd)
+    writer._fd = os.open(log_path, os.O_RDONLY)  # Writes now fail with EBADF
+
+    benchmark = LLMBenchmark(FakeLLM())
+    with caplog.at_level(logging.WARNING, logger="utils.benchmarking"):
+        writer.submit(benchmark.time_generation("a"))
+        writer.close()
+    assert "Could not write benchmark log" in caplog.text
+
+
+def test_batched_preset_run_sends_the_presets_sampling(cli_llm, monkeypatch):
+    commands = []
+
+    def execute(command):
+        commands.append(command)
+        return "ok"
+
+    monkeypatch.setattr(cli_llm.engine, "_execute_command", execute)
+    stats = cli_llm.benchmark.stress_test("Hi", 2, batched=True, preset="creative")
+
+    creative = cli_llm.engine.param_manager.describe_preset("creative")
+    assert len(commands) == 2
+    for command in commands:
+        temps = [command[i + 1] for i, arg in enumerate(command) if arg == "--temp"]
+        top_ps = [command[i + 1] for i, arg in enumerate(command) if arg == "--top-p"]
+        assert temps[-1] == str(creative["temperature"])
+        assert top_ps[-1] == str(creative["top_p"])
+    for result in stats["results"]:
+        assert result.parameters["temperature"] == creative["temperature"]
+        assert "preset" not in result.parameters
+    assert cli_llm.current_preset() == "default"
+
+
+def test_server_runs_record_token_timings():
+    llm = FakeLLM()
+    llm.engine.uses_server = True
+    result = LLMBenchmark(llm).time_generation("abcd")
+    assert result.tokens == 4
+    assert result.ttft > 0 and result.tps > 0
+
+
+def test_cli_runs_leave_token_timings_out_of_the_report():
+    benchmark = LLMBenchmark(FakeLLM())  # uses_server=False: chunks are lines
+    result = benchmark.time_generation("abcd")
+    assert (result.tokens, result.ttft, result.tps) == (0, 0.0, 0.0)
+    report = benchmark.generate_report()
+    assert "Tokens/sec" not in report and "first token" not in report
+
+
+def test_concurrent_runs_warm_up_then_match_server_slots(capsys):
+    llm = FakeLLM()
+    llm.engine.uses_server = True
+    stats = LLMBenchmark(llm).stress_test("abc", 6)
+
+    assert llm.calls[0] == "warmup" and llm.calls.count("warmup") == 1
+    assert len(stats["results"]) == 6
+    assert "(4 workers)" in capsys.readouterr().out
+
+
+def test_explicit_max_workers_wins(capsys):
+    llm = FakeLLM()
+    llm.engine.uses_server = True
+    LLMBenchmark(llm, max_workers=2).stress_test("abc", 6)
+    assert "(2 workers)" in capsys.readouterr().out
+
+
+def test_response_cache_accepts_list_parameters():
+    llm = FakeLLM()
+    benchmark = LLMBenchmark(llm, cache_responses=True)
+    first = benchmark.time_generation("abc", stop=["\n", "Human:"])
+    second = benchmark.time_generation("abc", stop=["\n", "Human:"])
+    other = benchmark.time_generation("abc", stop=["\n"])
+
+    assert (first.cache_hit, second.cache_hit, other.cache_hit) == (False, True, False)
+    assert second.response == first.response
+    assert llm.calls.count("generate") == 2
@@ -0,0 +1,183 @@
+import sys
+
+import pytest
+
+
+def test_build_payload(cli_engine):
+    payload = cli_engine._build_payload("Hello", {"temperature": 0.3, "top_p": 0.5})
+    assert payload == {
+        "prompt": "Hello",
+        "n_predict": 300,
+        "temperature": 0.3,
+        "top_p": 0.5,
+        "repeat_penalty": 1.15,
+        "repeat_last_n": 64,
+        "cache_prompt": True,
+    }
+
+
+def test_build_payload_ignores_unmanaged_params(cli_engine):
+    payload = cli_engine._build_payload("Hi", {"preset": "creative", "stop": ["\n"]})
+    assert "preset" not in payload and "stop" not in payload
+
+
+def _command(engine, params, prompt="Hello"):
+    model_info = engine.get_model_info()
+    command, _ = engine._build_command(model_info, prompt, params)
+    return command
+
+
+def test_build_command_prompt_cache_read_write(cli_engine, tmp_path):
+    command = _command(cli_engine, {"prompt_cache": tmp_path / "p.bin"})
+    i = command.index("--prompt-cache")
+    assert command[i + 1] == str(tmp_path / "p.bin")
+    assert "--prompt-cache-all" in command
+    assert "--prompt-cache-ro" not in command
+
+
+def test_build_command_prompt_cache_read_only(cli_engine, tmp_path):
+    command = _command(
+        cli_engine, {"prompt_cache": tmp_path / "p.bin", "prompt_cache_ro": True}
+    )
+    assert "--prompt-cache-ro" in command
+    assert "--prompt-cache-all" not in command
+
+
+def test_build_command_without_prompt_cache(cli_engine):
+    assert "--prompt-cache" not in _command(cli_engine, {})
+
+
+def _capture_commands(engine, monkeypatch, fail_first=False):
+    """Record llama-cli commands instead of running them"""
+    commands = []
+
+    def execute(command):
+        commands.append(command)
+        if fail_first and len(commands) == 1:
+            raise RuntimeError("boom")
+        return f"out{len(commands)}"
+
+    monkeypatch.setattr(engine, "_execute_command", execute)
+    return commands
+
+
+def test_generate_multi_writes_prompt_cache_once(cli_engine, monkeypatch):
+    commands = _capture_commands(cli_engine, monkeypatch)
+    results = cli_engine.generate_multi(
+        "Hello", [{"temperature": 0.3}, {"temperature": 0.9}, {}]
+    )
+
+    assert results == ["out1", "out2", "out3"]
+    paths = {c[c.index("--prompt-cache") + 1] for c in commands}
+    assert len(paths) == 1
+    assert "--prompt-cache-all" in commands[0]
+    assert all("--prompt-cache-ro" in c for c in commands[1:])
+
+
+def test_generate_multi_keeps_writing_until_a_run_succeeds(cli_engine, monkeypatch):
+    commands = _capture_commands(cli_engine, monkeypatch, fail_first=True)
+    results = cli_engine.generate_multi("Hello", [{}, {}, {}], return_exceptions=True)
+
+    assert isinstance(results[0], RuntimeError)
+    assert "--prompt-cache-all" in commands[1]
+    assert "--prompt-cache-ro" in commands[2]
+
+
+def _python(code):
+    """A command that runs code in a fresh interpreter, standing in for llama-cli"""
+    return [sys.executable, "-c", code]
+
+
+def test_stream_command_yields_lines_and_final_partial_line(cli_engine):
+    chunks = list(
+        cli_engine._stream_command(
+            _python("import sys; sys.stdout.write('one\\ntwo\\nlast')")
+        )
+    )
+    assert chunks == ["one\n", "two\n", "last"]
+
+
+def test_stream_command_decodes_utf8_split_across_reads(cli_engine):
+    code = (
+        "import os, time; os.write(1, 'é'.encode()[:1]); time.sleep(0.05); "
+        "os.write(1, 'é'.encode()[1:] + b'\\n')"
+    )
+    assert list(cli_engine._stream_command(_python(code))) == ["é\n"]
+
+
+def test_stream_command_raises_with_stderr_on_failure(cli_engine):
+    code = "import sys; sys.stderr.write('bad model'); sys.exit(1)"
+    with pytest.raises(RuntimeError, match="bad model"):
+        list(cli_engine._stream_command(_python(code)))
+
+
+def test_stream_command_drops_leaked_log_lines(cli_engine):
+    code = (
+        "print('llama_model_load: loading'); print('Answer'); "
+        "print('ggml_metal_init: ok'); print('main: done'); "
+        "print('  llama_ indented stays'); print('system_info: n_threads')"
+    )
+    chunks = list(cli_engine._stream_command(_python(code)))
+    assert chunks == ["Answer\n", "  llama_ indented stays\n"]
+
+
+def test_stream_command_drops_log_line_left_without_newline(cli_engine):
+    code = "import sys; sys.stdout.write('Answer\\nllama_perf: 1 ms')"
+    assert list(cli_engine._stream_command(_python(code))) == ["Answer\n"]
+
+
+def _flag_values(command, flag):
+    return [command[i + 1] for i, arg in enumerate(command) if arg == flag]
+
+
+def test_temperature_uses_temp_flag_and_t_is_threads(cli_engine):
+    command = _command(cli_engine, {"temperature": 1.7})
+    threads = str(min(cli_engine.memory_manager.system_info["usable_cores"], 16))
+    assert _flag_values(command, "--temp")[-1] == "1.7"
+    assert _flag_values(command, "-t") == [threads]
+
+
+def test_gpu_layers_param_overrides_profile(cli_engine):
+    command = _command(cli_engine, {"gpu_layers": 7})
+    assert _flag_values(command, "-ngl")[-1] == "7"
+
+
+def test_params_to_cli_follows_schema_order(cli_engine):
+    args = cli_engine._params_to_cli({"top_p": 0.5, "max_tokens": 10, "other": 1})
+    assert args == ["-n", "10", "--top-p", "0.5"]
+
+
+def test_params_to_cli_prefers_preformatted_strings(cli_engine):
+    args = cli_engine._params_to_cli({"temperature": 0.7}, {"temperature": "0.70"})
+    assert args == ["--temp", "0.70"]
+
+
+def test_build_command_starts_with_preset_flags(cli_engine):
+    command = _command(cli_engine, cli_engine.param_manager.get_parameters())
+    assert command[0] == cli_engine.get_model_info()["executable_full_path"]
+    assert list(zip(command[1:11:2], command[2:11:2])) == [
+        ("-n", "300"),
+        ("--temp", "0.8"),
+        ("--top-p", "0.9"),
+        ("--repeat-penalty", "1.15"),
+        ("--repeat-last-n", "64"),
+    ]
+    assert command[-2:] == ["-p", "Hello"]
+
+
+def test_build_command_appends_only_changed_overrides(cli_engine):
+    params = {**cli_engine.param_manager.get_parameters(), "temperature": 1.3}
+    command = _command(cli_engine, params)
+    assert _flag_values(command, "--temp") == ["0.8", "1.3"]
+    assert _flag_values(command, "--top-p") == ["0.9"]
+
+
+def test_build_command_tracks_preset_changes(cli_engine):
+    cli_engine.set_preset("precise")
+    command = _command(cli_engine, cli_engine.param_manager.get_parameters())
+    assert _flag_values(command, "--temp") == ["0.3"]
+    assert _flag_values(command, "-n") == ["200"]
+
+
+def test_server_slots_is_one_until_a_server_starts(cli_engine):
+    assert cli_engine.server_slots == 1
@@ -0,0 +1,26 @@
+def test_render_history_alternates_turns(cli_llm):
+    rendered = cli_llm._render_history(["Hi", "Hello!", "How are you?"])
+    assert rendered == "Human: Hi\nAssistant: Hello!\nHuman: How are you?\n"
+
+
+def test_render_history_renders_only_appended_turns(cli_llm):
+    context = ["Hi", "Hello!"]
+    first = cli_llm._render_history(context)
+
+    # Same list, appended to: earlier turns come from the memo, so an edit
+    # to them isn't seen (the documented contract)
+    context[0] = "edited"
+    context.append("Next")
+    assert cli_llm._render_history(context) == first + "Human: Next\n"
+
+
+def test_render_history_rerenders_a_new_list(cli_llm):
+    cli_llm._render_history(["Hi", "Hello!"])
+    assert cli_llm._render_history(["Yo", "Hey"]) == "Human: Yo\nAssistant: Hey\n"
+
+
+def test_render_history_rerenders_a_shrunk_list(cli_llm):
+    context = ["Hi", "Hello!", "More"]
+    cli_llm._render_history(context)
+    del context[1:]
+    assert cli_llm._render_history(context) == "Human: Hi\n"
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("psutil")
+
+from pre_flight_checker import PreFlightChecker, _estimate_bytes
+
+GB = 1024**3
+
+
+def _checker(available_gb):
+    checker = PreFlightChecker.__new__(PreFlightChecker)
+    checker.system_info = {"available_ram_gb": available_gb}
+    return checker
+
+
+def test_estimate_bytes():
+    # 4.5 GB model + 4096 x 512 x 4 bytes of context + 2 GB overhead
+    assert _estimate_bytes(45, 4096, 512) == 45 * GB // 10 + 4096 * 512 * 4 + 2 * GB
+
+
+@pytest.mark.parametrize(
+    "available_gb, safe, label",
+    [
+        (20.0, True, "SAFE"),
+        (6.0, True, "RISKY"),  # ~6.5 GB needed: over 90%, under 120%
+        (4.0, False, "UNSAFE"),
+    ],
+)
+def test_can_run_safely_thresholds(available_gb, safe, label):
+    ok, message, _ = _checker(available_gb).can_run_safely(4.5, 4096, 512)
+    assert ok is safe
+    assert f" {label}:" in message
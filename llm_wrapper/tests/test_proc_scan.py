@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from proc_scan import descendants, parse_ppid, read_meminfo_fields
+
+
+def test_parse_ppid():
+    assert parse_ppid(b"1234 (python) S 42 1234 1234 0 -1") == 42
+
+
+def test_parse_ppid_comm_with_spaces_and_parens():
+    assert parse_ppid(b"77 (a b) (c)) R 5 77 77 0 -1") == 5
+
+
+def test_descendants():
+    ppid_map = {2: 1, 3: 2, 4: 3, 5: 1, 6: 99}
+    assert descendants(ppid_map, 1) == {2, 3, 4, 5}
+    assert descendants(ppid_map, 3) == {4}
+    assert descendants(ppid_map, 4) == set()
+
+
+def test_descendants_terminates_on_cycles():
+    assert descendants({2: 3, 3: 2}, 2) == {2, 3}
+
+
+def test_read_meminfo_fields(tmp_path):
+    meminfo = tmp_path / "meminfo"
+    meminfo.write_bytes(
+        b"MemTotal:       16384 kB\n"
+        b"MemFree:         1024 kB\n"
+        b"MemAvailable:    8192 kB\n"
+        b"SwapTotal:       2048 kB\n"
+        b"SwapFree:        2048 kB\n"
+    )
+    fd = os.open(meminfo, os.O_RDONLY)
+    try:
+        assert read_meminfo_fields(fd, b"MemAvailable", b"SwapTotal") == [
+            8192 * 1024,
+            2048 * 1024,
+        ]
+        # "MemFree" must not match inside another key
+        assert read_meminfo_fields(fd, b"MemFree") == [1024 * 1024]
+        with pytest.raises(ValueError):
+            read_meminfo_fields(fd, b"Missing")
+    finally:
+        os.close(fd)
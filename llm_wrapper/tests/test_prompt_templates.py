@@ -0,0 +1,85 @@
+import pytest
+
+from utils.prompt_templates import (
+    PromptTemplate,
+    PromptTemplates,
+    _TEMPLATES,
+    format_prompt,
+)
+
+
+@pytest.mark.parametrize("name", sorted(_TEMPLATES))
+def test_builtin_templates_compile_and_match_str_format(name):
+    template = _TEMPLATES[name]
+    kwargs = {var: f"<{var}>" for var in PromptTemplates().get_template_vars(name)}
+    assert template._render is not None
+    assert template.render(**kwargs) == template.template.format(**kwargs)
+
+
+def test_render_escapes_quotes_backslashes_and_braces():
+    template = PromptTemplate("t", 'Say "{a}" \\ \'{b}\'\n{{literal}} {a}', "")
+    assert template._render is not None
+    assert template.render(a="x", b="y") == 'Say "x" \\ \'y\'\n{literal} x'
+
+
+def test_render_ignores_extra_kwargs():
+    template = PromptTemplate("t", "Hi {name}", "")
+    assert template.render(name="Ann", unused=1) == "Hi Ann"
+
+
+def test_render_missing_variable_raises_key_error():
+    with pytest.raises(KeyError):
+        PromptTemplate("t", "Hi {name}", "").render()
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["{value:>5}", "{value!r}", "{user.name}", "{items[0]}", "{class}", "{0}"],
+)
+def test_non_plain_fields_fall_back_to_str_format(text):
+    assert PromptTemplate("t", text, "")._render is None
+
+
+def test_fallback_render_matches_str_format():
+    class User:
+        name = "Ann"
+
+    template = PromptTemplate("t", "{user.name} has {items[0]} ({n:03d})", "")
+    assert template.render(user=User(), items=["tea"], n=7) == "Ann has tea (007)"
+
+
+def test_malformed_template_fails_at_definition():
+    with pytest.raises(ValueError):
+        PromptTemplate("t", "unclosed {field", "")
+
+
+def test_required_uses_base_argument_names():
+    template = PromptTemplate("t", "Hi {user.name} and {x[0]} {y!r}", "")
+    assert template._required == {"user", "x", "y"}
+
+
+def test_format_prompt():
+    prompt = format_prompt("summarize", content_type="email", content="Hello")
+    assert "email" in prompt and "Hello" in prompt
+
+
+def test_format_prompt_lists_all_missing_variables():
+    with pytest.raises(ValueError, match="character_description, message"):
+        format_prompt("roleplay", character="Ann")
+
+
+def test_format_prompt_accepts_attribute_fields(monkeypatch):
+    class User:
+        name = "Ann"
+
+    templates = PromptTemplates()
+    custom = PromptTemplate("greet", "Hi {user.name} and {x[0]}", "")
+    monkeypatch.setattr(templates, "templates", {"greet": custom})
+    assert templates.format_prompt("greet", user=User(), x=[1]) == "Hi Ann and 1"
+    assert templates.get_template_vars("greet") == {"user", "x"}
+
+
+def test_list_templates_is_a_shared_tuple():
+    templates = PromptTemplates()
+    assert templates.list_templates() is templates.list_templates()
+    assert set(templates.list_templates()) == set(_TEMPLATES)
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from core import _yaml_cache
+from core._yaml_cache import invalidate, load_yaml
+
+
+@pytest.fixture
+def config(tmp_path):
+    path = tmp_path / "settings.yaml"
+    path.write_text("name: first\nvalues: [1, 2]\n")
+    yield path
+    _yaml_cache._CACHE.pop(os.path.abspath(path), None)
+
+
+def _rewrite(path, text):
+    """Change the file so its (mtime, size) key differs from the cached one"""
+    st = path.stat()
+    path.write_text(text)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_load_yaml_parses_and_copies(config):
+    data = load_yaml(config)
+    assert data == {"name": "first", "values": [1, 2]}
+    data["values"].append(3)
+    assert load_yaml(config)["values"] == [1, 2]
+
+
+def test_load_yaml_without_copy_shares_cached_data(config):
+    assert load_yaml(config, copy_result=False) is load_yaml(config, copy_result=False)
+
+
+def test_changed_file_is_reparsed(config):
+    load_yaml(config)
+    _rewrite(config, "name: second\n")
+    assert load_yaml(config) == {"name": "second"}
+
+
+def test_invalidate_drops_the_cached_entry(config):
+    load_yaml(config)
+    invalidate(config)
+    assert os.path.abspath(config) not in _yaml_cache._CACHE
+
+
+def test_load_yaml_writes_json_side_cache(config):
+    load_yaml(config)
+    assert config.with_suffix(".cached.json").exists()
+
+
+def test_stale_json_cache_is_ignored_across_processes(config):
+    load_yaml(config)
+    _rewrite(config, "name: changed\n")
+    # A fresh process has no in-memory entry and only the old JSON file
+    _yaml_cache._CACHE.clear()
+    assert load_yaml(config) == {"name": "changed"}
+
+
+def test_invalidate_removes_json_side_cache(config):
+    load_yaml(config)
+    invalidate(config)
+    assert not config.with_suffix(".cached.json").exists()
+
+
+def test_non_string_keys_skip_the_json_side_cache(tmp_path):
+    path = tmp_path / "keys.yaml"
+    path.write_text("limits:\n  1: one\n  true: yes-key\n")
+    try:
+        expected = {"limits": {1: "one", True: "yes-key"}}
+        assert load_yaml(path) == expected
+        assert not path.with_suffix(".cached.json").exists()
+        _yaml_cache._CACHE.clear()
+        assert load_yaml(path) == expected
+    finally:
+        _yaml_cache._CACHE.pop(os.path.abspath(path), None)
+
+
+def test_unrepresentable_values_skip_the_json_side_cache(tmp_path):
+    path = tmp_path / "dates.yaml"
+    path.write_text("released: 2024-01-31\n")
+    try:
+        load_yaml(path)
+        assert not path.with_suffix(".cached.json").exists()
+    finally:
+        _yaml_cache._CACHE.pop(os.path.abspath(path), None)
@@ -1,10 +1,22 @@
+import json
+import logging
+import math
+import os
+import queue
+import sys
+import threading
 import time
-from typing import Dict, List, Any, Callable
-from dataclasses import dataclass
-from statistics import mean, median, stdev
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Callable, Optional, Tuple
+from dataclasses import asdict, dataclass
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+# Slotted and frozen: stress runs keep thousands of these
+@dataclass(frozen=True, slots=True)
 class BenchmarkResult:
     """Results from a benchmark run"""
 
@@ -14,55 +26,298 @@ class BenchmarkResult:
     parameters: Dict[str, Any]
     model: str
     timestamp: float
+    cache_hit: bool = False
+    # Streaming timings: time to first token, tokens received and decode rate
+    # after the first. llama-server only - llama-cli streams whole lines, so
+    # CLI runs leave these at 0 and reports skip them
+    ttft: float = 0.0
+    tokens: int = 0
+    tps: float = 0.0
+
+
+class RunningStats:
+    """Single-pass count/mean/variance/min/max (Welford's algorithm)"""
+
+    __slots__ = ("n", "mean", "m2", "min", "max", "total")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.total = 0.0
+
+    def push(self, x: float):
+        self.n += 1
+        self.total += x
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    @property
+    def stdev(self) -> float:
+        """Sample standard deviation (0 for fewer than two values)"""
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty list"""
+    rank = math.ceil(len(sorted_values) * pct / 100)
+    return sorted_values[max(rank, 1) - 1]
+
+
+class _ResultWriter:
+    """
+    Appends results to a JSON-lines file from a background thread, so disk
+    writes overlap the next generation. Whatever has queued up by the time
+    the thread wakes goes out as one write.
+    """
+
+    def __init__(self, path: str, max_batch: int = 32):
+        self.max_batch = max_batch
+        self._fd = os.open(
+            path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC, 0o644
+        )
+        self._queue: "queue.Queue[Optional[BenchmarkResult]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, result: BenchmarkResult):
+        self._queue.put(result)
+
+    def _run(self):
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:  # close() sentinel: write what came before it
+                batch = batch[: batch.index(None)]
+                running = False
+            if batch:
+                lines = (json.dumps(asdict(r), default=str) + "\n" for r in batch)
+                self._write("".join(lines).encode())
+
+    def _write(self, data: bytes):
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view) :]
+        except OSError as e:
+            logger.warning("⚠️  Could not write benchmark log: %s", e)
+
+    def close(self):
+        """Flush queued results and close the file"""
+        self._queue.put(None)
+        self._thread.join()
+        os.close(self._fd)
 
 
 class LLMBenchmark:
     """Benchmarking tools for LLM performance"""
 
-    def __init__(self, llm_instance):
-        self.llm = llm_instance
-        self.results = []
+    DEFAULT_PRESETS = ("default", "creative", "precise")
 
-    def time_generation(self, prompt: str, **kwargs) -> BenchmarkResult:
-        """Time a single generation"""
+    def __init__(
+        self,
+        llm_instance,
+        cache_responses: bool = False,
+        log_path: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        history_cap: Optional[int] = 10_000,
+    ):
+        self.llm = llm_instance
+        # Pool size for concurrent runs; None matches llama-server's slots
+        self.max_workers = max_workers
+        # Only the newest history_cap results are kept (None: all of them)
+        self.history_cap = history_cap
+        self.results = deque(maxlen=history_cap)
+        self._reset_columns()
+        self._lock = threading.Lock()  # _time_all records from worker threads
+        # Exact-match response cache: (model, params JSON, prompt) -> response.
+        # Off by default - timing a cached answer says nothing about the model
+        self.cache_responses = cache_responses
+        self._cache: Dict[tuple, str] = {}
+        # Optional JSON-lines log of every result, written off the hot path
+        self._writer = _ResultWriter(log_path) if log_path else None
+
+    def time_generation(
+        self, prompt: str, preset: Optional[str] = None, **kwargs
+    ) -> BenchmarkResult:
+        """Time a single generation, optionally under a preset (without switching to it)"""
+        kwargs = self._with_preset(preset, kwargs)
+        parameters = {**self.llm.current_parameters(), **kwargs}
+        model = self.llm.current_model()
+        # JSON keeps the key hashable when values are lists (e.g. stop sequences)
+        key = (model, json.dumps(parameters, sort_keys=True, default=str), prompt)
+
+        # Monotonic ns clock for the duration; wall clock only for the timestamp
         start_time = time.time()
-
-        response = self.llm.generate(prompt, **kwargs)
-
-        end_time = time.time()
-        duration = end_time - start_time
+        start_ns = time.perf_counter_ns()
+
+        response = self._cache.get(key) if self.cache_responses else None
+        cache_hit = response is not None
+        first_ns = None
+        tokens = 0
+        if not cache_hit:
+            chunks = []
+            for chunk in self.llm.generate_stream(prompt, **kwargs):
+                if first_ns is None:
+                    first_ns = time.perf_counter_ns()
+                chunks.append(chunk)
+            tokens = len(chunks)
+            response = "".join(chunks).strip()
+            if self.cache_responses:
+                self._cache[key] = response
+
+        end_ns = time.perf_counter_ns()
+        duration = (end_ns - start_ns) / 1e9
+        if not getattr(self.llm.engine, "uses_server", False):
+            first_ns, tokens = None, 0  # Chunks are lines, not tokens
+        ttft = (first_ns - start_ns) / 1e9 if first_ns is not None else 0.0
+        decode_time = (end_ns - first_ns) / 1e9 if first_ns is not None else 0.0
+        tps = (tokens - 1) / decode_time if tokens > 1 and decode_time > 0 else 0.0
 
         result = BenchmarkResult(
-            prompt=prompt,
+            prompt=sys.intern(prompt),  # Repeated runs share one string
             response=response,
             duration=duration,
-            parameters=self.llm.current_parameters(),
-            model=self.llm.current_model(),
+            parameters=parameters,
+            model=model,
             timestamp=start_time,
+            cache_hit=cache_hit,
+            ttft=ttft,
+            tokens=tokens,
+            tps=tps,
         )
 
-        self.results.append(result)
+        self._record([result])
         return result
 
+    def _with_preset(
+        self, preset: Optional[str], kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """kwargs on top of a preset's parameters, for one call"""
+        if preset is None:
+            return kwargs
+        # The preset travels with this call; the active preset is untouched
+        preset_params = self.llm.engine.param_manager.describe_preset(preset)
+        return {**preset_params, **kwargs}
+
+    def _reset_columns(self):
+        # Columnar copies of the kept results' numeric fields, so reports
+        # aggregate over flat C doubles instead of walking the result objects.
+        # Once full they're a ring: _head is the oldest slot, overwritten next
+        self._durations = array("d")
+        self._resp_lens = array("d")
+        self._head = 0
+        # Every run ever recorded, including those dropped from the history
+        self._duration_stats = RunningStats()
+        self._length_stats = RunningStats()
+
+    def _record(self, results: List[BenchmarkResult]):
+        """Append results to the history and its numeric columns"""
+        with self._lock:
+            self.results.extend(results)
+            cap = self.history_cap
+            for r in results:
+                length = len(r.response)
+                self._duration_stats.push(r.duration)
+                self._length_stats.push(length)
+                if cap is None or len(self._durations) < cap:
+                    self._durations.append(r.duration)
+                    self._resp_lens.append(length)
+                elif cap:
+                    self._durations[self._head] = r.duration
+                    self._resp_lens[self._head] = length
+                    self._head = (self._head + 1) % cap
+        if self._writer is not None:
+            for r in results:
+                self._writer.submit(r)
+
+    def _time_all(
+        self, jobs: List[Tuple[str, Dict[str, Any]]], max_workers: Optional[int] = None
+    ) -> List[BenchmarkResult]:
+        """Time each (prompt, overrides) job; concurrently when a server is in use"""
+        # Only a persistent server can take concurrent requests; parallel
+        # one-shot CLI runs would each load the whole model
+        engine = getattr(self.llm, "engine", None)
+        if len(jobs) > 1 and getattr(engine, "uses_server", False):
+            # Load the model first, so no timed run includes server start-up
+            self.llm.warmup()
+            if max_workers is None:
+                max_workers = self.max_workers
+            if max_workers is None:
+                # Requests beyond llama-server's slots wait in its queue, and
+                # that wait would be timed as generation
+                max_workers = min(len(jobs), engine.server_slots)
+            print(f"  Sending requests concurrently ({max_workers} workers)")
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                return list(
+                    pool.map(lambda job: self.time_generation(job[0], **job[1]), jobs)
+                )
+
+        # Per-run progress goes to the logger (DEBUG) so stdout isn't
+        # written and flushed between timed runs
+        results = []
+        for i, (prompt, overrides) in enumerate(jobs):
+            result = self.time_generation(prompt, **overrides)
+            logger.debug("Run %d/%d: %.2fs", i + 1, len(jobs), result.duration)
+            results.append(result)
+        return results
+
+    def batch_time(
+        self, prompts: List[str], preset: Optional[str] = None, **kwargs
+    ) -> List[BenchmarkResult]:
+        """
+        Time all prompts as one generate_batch call, leaving scheduling to
+        llama-server's slots. Each result's duration is the batch time / n.
+        """
+        kwargs = self._with_preset(preset, kwargs)
+        parameters = {**self.llm.current_parameters(), **kwargs}
+        model = self.llm.current_model()
+
+        start_time = time.time()
+        start_ns = time.perf_counter_ns()
+        responses = self.llm.generate_batch(prompts, **kwargs)
+        duration = (time.perf_counter_ns() - start_ns) / 1e9
+
+        results = [
+            BenchmarkResult(
+                prompt=sys.intern(prompt),
+                response=response,
+                duration=duration / len(prompts),
+                parameters=parameters,
+                model=model,
+                timestamp=start_time,
+            )
+            for prompt, response in zip(prompts, responses)
+        ]
+        self._record(results)
+        return results
+
     def benchmark_presets(
         self, prompt: str, presets: List[str] = None
     ) -> Dict[str, BenchmarkResult]:
         """Benchmark different presets with the same prompt"""
         if presets is None:
-            presets = ["default", "creative", "precise"]
+            presets = self.DEFAULT_PRESETS
 
-        results = {}
-        original_preset = self.llm.current_preset()
+        # Per-call presets leave shared state alone, so the runs can overlap
+        jobs = [(prompt, {"preset": preset}) for preset in presets]
+        print(f"🔄 Benchmarking presets: {', '.join(presets)}")
 
-        try:
-            for preset in presets:
-                print(f"🔄 Benchmarking preset: {preset}")
-                self.llm.set_preset(preset)
-                result = self.time_generation(prompt)
-                results[preset] = result
-                print(f"  ⏱️  {result.duration:.2f}s")
-        finally:
-            self.llm.set_preset(original_preset)
+        results = dict(zip(presets, self._time_all(jobs)))
+        for preset, result in results.items():
+            print(f"  {preset}: ⏱️  {result.duration:.2f}s")
 
         return results
 
@@ -70,40 +325,56 @@ class LLMBenchmark:
         self, prompt: str, parameter_sets: List[Dict[str, Any]]
     ) -> List[BenchmarkResult]:
         """Benchmark different parameter combinations"""
-        results = []
+        print(f"🔄 Benchmarking {len(parameter_sets)} parameter sets")
+        results = self._time_all([(prompt, params) for params in parameter_sets])
 
-        for i, params in enumerate(parameter_sets):
-            print(
-                f"🔄 Benchmarking parameter set {i+1}/{len(parameter_sets)}: {params}"
-            )
-            result = self.time_generation(prompt, **params)
-            results.append(result)
-            print(f"  ⏱️  {result.duration:.2f}s")
+        for i, (params, result) in enumerate(zip(parameter_sets, results)):
+            print(f"  {i+1}/{len(parameter_sets)} {params}: ⏱️  {result.duration:.2f}s")
 
         return results
 
-    def stress_test(self, prompt: str, iterations: int = 5, **kwargs) -> Dict[str, Any]:
-        """Run multiple iterations to test consistency"""
-        print(f"🔄 Running stress test: {iterations} iterations")
-
-        results = []
-        for i in range(iterations):
-            print(f"  Iteration {i+1}/{iterations}")
-            result = self.time_generation(prompt, **kwargs)
-            results.append(result)
+    def stress_test(
+        self,
+        prompt: str,
+        iterations: int = 5,
+        max_workers: Optional[int] = None,
+        batched: bool = False,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Run multiple iterations to test consistency. batched=True sends them
+        as one batch (throughput); per-run timings are then the batch average.
+        """
+        # statistics is imported here, not at module level: plain timing runs
+        # don't need it and it adds a few ms to import time
+        from statistics import median
 
-        durations = [r.duration for r in results]
-        response_lengths = [len(r.response) for r in results]
+        print(f"🔄 Running stress test: {iterations} iterations")
+        if batched:
+            results = self.batch_time([prompt] * iterations, **kwargs)
+        else:
+            results = self._time_all([(prompt, kwargs)] * iterations, max_workers)
+
+        # Cache hits would drag the timings towards zero; time real runs only
+        cache_hits = sum(r.cache_hit for r in results)
+        timed = [r for r in results if not r.cache_hit] or results
+        durations = RunningStats()
+        for r in timed:
+            durations.push(r.duration)
+        lengths = RunningStats()
+        for r in results:
+            lengths.push(len(r.response))
 
         return {
             "iterations": iterations,
-            "total_time": sum(durations),
-            "avg_time": mean(durations),
-            "median_time": median(durations),
-            "std_dev": stdev(durations) if len(durations) > 1 else 0,
-            "min_time": min(durations),
-            "max_time": max(durations),
-            "avg_response_length": mean(response_lengths),
+            "cache_hits": cache_hits,
+            "total_time": durations.total,
+            "avg_time": durations.mean,
+            "median_time": median(r.duration for r in timed),
+            "std_dev": durations.stdev,
+            "min_time": durations.min,
+            "max_time": durations.max,
+            "avg_response_length": lengths.mean,
             "results": results,
         }
 
@@ -112,35 +383,88 @@ class LLMBenchmark:
         if not self.results:
             return "No benchmark results available."
 
-        durations = [r.duration for r in self.results]
-        response_lengths = [len(r.response) for r in self.results]
+        from statistics import median
+
+        durations = self._duration_stats
+        # Order statistics can only come from the results still kept
+        window = "" if len(self.results) == durations.n else " (recent runs)"
 
         report = []
         report.append("=" * 50)
         report.append("LLM BENCHMARK REPORT")
         report.append("=" * 50)
-        report.append(f"Total runs: {len(self.results)}")
-        report.append(f"Average duration: {mean(durations):.2f}s")
-        report.append(f"Median duration: {median(durations):.2f}s")
+        report.append(f"Total runs: {durations.n}")
+        report.append(f"Average duration: {durations.mean:.2f}s")
         report.append(
-            f"Min/Max duration: {min(durations):.2f}s / {max(durations):.2f}s"
+            f"Median duration{window}: {median(self._durations):.2f}s"
         )
-        report.append(f"Average response length: {mean(response_lengths):.0f} chars")
+        report.append(
+            f"Min/Max duration: {durations.min:.2f}s / {durations.max:.2f}s"
+        )
+        report.append(f"Average response length: {self._length_stats.mean:.0f} chars")
 
-        if len(durations) > 1:
-            report.append(f"Standard deviation: {stdev(durations):.2f}s")
+        if durations.n > 1:
+            report.append(f"Standard deviation: {durations.stdev:.2f}s")
+
+        streamed = [r for r in self.results if r.tokens]
+        if streamed:
+            ttfts = sorted(r.ttft for r in streamed)
+            rates = sorted(r.tps for r in streamed)
+            report.append(
+                f"Time to first token p50/p95{window}: {_percentile(ttfts, 50):.2f}s / {_percentile(ttfts, 95):.2f}s"
+            )
+            report.append(
+                f"Tokens/sec p50/p95{window}: {_percentile(rates, 50):.1f} / {_percentile(rates, 95):.1f}"
+            )
 
         report.append("\nRecent Results:")
-        for i, result in enumerate(self.results[-5:], 1):
+        recent = [self.results[i] for i in range(-min(5, len(self.results)), 0)]
+        for i, result in enumerate(recent, 1):
             report.append(f"{i}. {result.duration:.2f}s - {result.prompt[:50]}...")
 
         return "\n".join(report)
 
     def clear_results(self):
         """Clear benchmark history"""
-        self.results = []
+        with self._lock:
+            self.results = deque(maxlen=self.history_cap)
+            self._reset_columns()
         print("✓ Benchmark results cleared")
 
+    def as_dataframe(self):
+        """Kept benchmark history as a pandas DataFrame (needs pandas installed)"""
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError("as_dataframe() requires pandas: pip install pandas")
+
+        def in_order(column):  # Undo the ring rotation: oldest first
+            return (column[self._head :] + column[: self._head]).tolist()
+
+        return pd.DataFrame(
+            {
+                "prompt": [r.prompt for r in self.results],
+                "model": [r.model for r in self.results],
+                "duration": in_order(self._durations),
+                "response_length": in_order(self._resp_lens),
+                "ttft": [r.ttft for r in self.results],
+                "tokens": [r.tokens for r in self.results],
+                "tps": [r.tps for r in self.results],
+                "cache_hit": [r.cache_hit for r in self.results],
+                "timestamp": [r.timestamp for r in self.results],
+            }
+        )
+
+    def clear_cache(self):
+        """Drop cached responses"""
+        self._cache.clear()
+
+    def close(self):
+        """Finish writing the result log, if one is open"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
 
 def quick_benchmark(
     llm_instance, prompt: str = "Tell me a short story about robots."
@@ -1,8 +1,13 @@
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+import functools
+import keyword
+import re
+import string
+from types import MappingProxyType
+from typing import Callable, Dict, Optional, Any, FrozenSet, Mapping, Tuple
+from dataclasses import dataclass, field
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class PromptTemplate:
     """A reusable prompt template"""
 
@@ -10,97 +15,166 @@ class PromptTemplate:
     template: str
     description: str
     default_params: Optional[Dict[str, Any]] = None
+    # Renderer compiled from the template at construction; None when the
+    # template uses format specs, conversions or attribute/index lookups
+    _render: Optional[Callable[[Mapping[str, Any]], str]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    # Variable names the template needs, checked before rendering
+    _required: FrozenSet[str] = field(
+        default=frozenset(), init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        # Parsing here also rejects malformed templates ("{" without "}")
+        # when they're defined rather than on first use
+        object.__setattr__(self, "_required", _template_vars(self.template))
+        body = []
+        names = []
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(
+            self.template
+        ):
+            body.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field_name is None:
+                continue
+            if (
+                format_spec
+                or conversion
+                or not field_name.isidentifier()
+                or keyword.iskeyword(field_name)
+            ):
+                return  # Leave anything beyond plain {name} to str.format
+            body.append("{" + field_name + "}")
+            if field_name not in names:
+                names.append(field_name)
+        # One f-string: the literal text is baked in and each field is a
+        # local, so rendering skips str.format's runtime parse
+        lookups = "".join(f"_kw[{name!r}], " for name in names)
+        src = "def _render(_kw):\n"
+        if names:
+            src += f"    {', '.join(names)}, = {lookups}\n"
+        src += f"    return f{''.join(body)!r}\n"
+        namespace: Dict[str, Any] = {}
+        exec(src, namespace)
+        # Frozen dataclass: derived fields are set once, here
+        object.__setattr__(self, "_render", namespace["_render"])
+
+    def render(self, **kwargs) -> str:
+        """Fill in the template (same result as template.format(**kwargs))"""
+        if self._render is None:
+            return self.template.format(**kwargs)
+        return self._render(kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def _template_vars(template: str) -> FrozenSet[str]:
+    """
+    Argument names the {fields} of a template string need ({{ }} escapes are
+    ignored); {user.name} and {x[0]} need "user" and "x"
+    """
+    return frozenset(
+        re.match(r"[^.[]*", field_name).group()
+        for _, field_name, _, _ in string.Formatter().parse(template)
+        if field_name
+    )
+
+
+# Built once at import and shared read-only by every PromptTemplates
+_TEMPLATES: Mapping[str, PromptTemplate] = MappingProxyType(
+    {
+        # Research and Analysis
+        "analyze": PromptTemplate(
+            name="analyze",
+            template="Please analyze the following {content_type}:\n\n{content}\n\nProvide a detailed analysis covering:\n1. Key points\n2. Strengths and weaknesses\n3. Implications\n4. Recommendations",
+            description="Analyze any type of content systematically",
+            default_params={"temperature": 0.7, "max_tokens": 400},
+        ),
+        "summarize": PromptTemplate(
+            name="summarize",
+            template="Please provide a concise summary of the following {content_type}:\n\n{content}\n\nSummary:",
+            description="Summarize content efficiently",
+            default_params={"temperature": 0.5, "max_tokens": 200},
+        ),
+        # Creative Writing
+        "story": PromptTemplate(
+            name="story",
+            template="Write a {story_type} story about {topic}. The story should be {tone} in tone and approximately {length} long.\n\nStory:",
+            description="Generate creative stories with specific parameters",
+            default_params={"temperature": 1.0, "max_tokens": 500},
+        ),
+        "character": PromptTemplate(
+            name="character",
+            template="Create a detailed character description for {character_type}. Include:\n- Physical appearance\n- Personality traits\n- Background\n- Motivations\n- Unique quirks\n\nCharacter: {name}",
+            description="Generate detailed character profiles",
+            default_params={"temperature": 0.9, "max_tokens": 300},
+        ),
+        # Code and Technical
+        "code_review": PromptTemplate(
+            name="code_review",
+            template="Please review the following {language} code:\n\n```{language}\n{code}\n```\n\nProvide feedback on:\n1. Code quality and structure\n2. Potential bugs or issues\n3. Performance considerations\n4. Best practices\n5. Suggestions for improvement",
+            description="Review code for quality and improvements",
+            default_params={"temperature": 0.4, "max_tokens": 400},
+        ),
+        "explain_code": PromptTemplate(
+            name="explain_code",
+            template="Please explain what this {language} code does in simple terms:\n\n```{language}\n{code}\n```\n\nExplanation:",
+            description="Explain code functionality clearly",
+            default_params={"temperature": 0.6, "max_tokens": 250},
+        ),
+        # Conversational
+        "roleplay": PromptTemplate(
+            name="roleplay",
+            template="You are {character}. {character_description}\n\nHuman: {message}\n{character}:",
+            description="Roleplay as specific characters",
+            default_params={"temperature": 0.8, "max_tokens": 200},
+        ),
+        "debate": PromptTemplate(
+            name="debate",
+            template="Present arguments {position} the following topic: {topic}\n\nProvide 3-4 strong arguments with evidence and reasoning.\n\nArguments {position} {topic}:",
+            description="Generate debate arguments for any position",
+            default_params={"temperature": 0.7, "max_tokens": 350},
+        ),
+        # Research Templates
+        "research_outline": PromptTemplate(
+            name="research_outline",
+            template="Create a detailed research outline for the topic: {topic}\n\nThe outline should include:\n1. Introduction and thesis\n2. Main sections with subsections\n3. Key questions to explore\n4. Potential sources\n5. Conclusion points\n\nOutline:",
+            description="Generate comprehensive research outlines",
+            default_params={"temperature": 0.6, "max_tokens": 400},
+        ),
+        # Uncensored/Open Templates
+        "uncensored_creative": PromptTemplate(
+            name="uncensored_creative",
+            template="Write freely and creatively about {topic}. Express your thoughts without restrictions, exploring all angles and perspectives. Let your creativity flow naturally.\n\nTopic: {topic}\n\nResponse:",
+            description="Open-ended creative expression",
+            default_params={"temperature": 1.1, "max_tokens": 500},
+        ),
+        "explore_concept": PromptTemplate(
+            name="explore_concept",
+            template="Explore the concept of {concept} from multiple perspectives. Consider:\n- Different viewpoints and interpretations\n- Historical context\n- Modern applications\n- Controversial aspects\n- Future implications\n\nExploration of {concept}:",
+            description="Deep exploration of concepts from all angles",
+            default_params={"temperature": 0.8, "max_tokens": 450},
+        ),
+    }
+)
 
 
 class PromptTemplates:
     """Collection of useful prompt templates for different tasks"""
 
     def __init__(self):
-        self.templates = {
-            # Research and Analysis
-            "analyze": PromptTemplate(
-                name="analyze",
-                template="Please analyze the following {content_type}:\n\n{content}\n\nProvide a detailed analysis covering:\n1. Key points\n2. Strengths and weaknesses\n3. Implications\n4. Recommendations",
-                description="Analyze any type of content systematically",
-                default_params={"temperature": 0.7, "max_tokens": 400},
-            ),
-            "summarize": PromptTemplate(
-                name="summarize",
-                template="Please provide a concise summary of the following {content_type}:\n\n{content}\n\nSummary:",
-                description="Summarize content efficiently",
-                default_params={"temperature": 0.5, "max_tokens": 200},
-            ),
-            # Creative Writing
-            "story": PromptTemplate(
-                name="story",
-                template="Write a {story_type} story about {topic}. The story should be {tone} in tone and approximately {length} long.\n\nStory:",
-                description="Generate creative stories with specific parameters",
-                default_params={"temperature": 1.0, "max_tokens": 500},
-            ),
-            "character": PromptTemplate(
-                name="character",
-                template="Create a detailed character description for {character_type}. Include:\n- Physical appearance\n- Personality traits\n- Background\n- Motivations\n- Unique quirks\n\nCharacter: {name}",
-                description="Generate detailed character profiles",
-                default_params={"temperature": 0.9, "max_tokens": 300},
-            ),
-            # Code and Technical
-            "code_review": PromptTemplate(
-                name="code_review",
-                template="Please review the following {language} code:\n\n```{language}\n{code}\n```\n\nProvide feedback on:\n1. Code quality and structure\n2. Potential bugs or issues\n3. Performance considerations\n4. Best practices\n5. Suggestions for improvement",
-                description="Review code for quality and improvements",
-                default_params={"temperature": 0.4, "max_tokens": 400},
-            ),
-            "explain_code": PromptTemplate(
-                name="explain_code",
-                template="Please explain what this {language} code does in simple terms:\n\n```{language}\n{code}\n```\n\nExplanation:",
-                description="Explain code functionality clearly",
-                default_params={"temperature": 0.6, "max_tokens": 250},
-            ),
-            # Conversational
-            "roleplay": PromptTemplate(
-                name="roleplay",
-                template="You are {character}. {character_description}\n\nHuman: {message}\n{character}:",
-                description="Roleplay as specific characters",
-                default_params={"temperature": 0.8, "max_tokens": 200},
-            ),
-            "debate": PromptTemplate(
-                name="debate",
-                template="Present arguments {position} the following topic: {topic}\n\nProvide 3-4 strong arguments with evidence and reasoning.\n\nArguments {position} {topic}:",
-                description="Generate debate arguments for any position",
-                default_params={"temperature": 0.7, "max_tokens": 350},
-            ),
-            # Research Templates
-            "research_outline": PromptTemplate(
-                name="research_outline",
-                template="Create a detailed research outline for the topic: {topic}\n\nThe outline should include:\n1. Introduction and thesis\n2. Main sections with subsections\n3. Key questions to explore\n4. Potential sources\n5. Conclusion points\n\nOutline:",
-                description="Generate comprehensive research outlines",
-                default_params={"temperature": 0.6, "max_tokens": 400},
-            ),
-            # Uncensored/Open Templates
-            "uncensored_creative": PromptTemplate(
-                name="uncensored_creative",
-                template="Write freely and creatively about {topic}. Express your thoughts without restrictions, exploring all angles and perspectives. Let your creativity flow naturally.\n\nTopic: {topic}\n\nResponse:",
-                description="Open-ended creative expression",
-                default_params={"temperature": 1.1, "max_tokens": 500},
-            ),
-            "explore_concept": PromptTemplate(
-                name="explore_concept",
-                template="Explore the concept of {concept} from multiple perspectives. Consider:\n- Different viewpoints and interpretations\n- Historical context\n- Modern applications\n- Controversial aspects\n- Future implications\n\nExploration of {concept}:",
-                description="Deep exploration of concepts from all angles",
-                default_params={"temperature": 0.8, "max_tokens": 450},
-            ),
-        }
+        self.templates = _TEMPLATES
+        self._names = tuple(self.templates)
 
     def get_template(self, name: str) -> PromptTemplate:
         """Get a specific template"""
         if name not in self.templates:
-            available = list(self.templates.keys())
+            available = list(self._names)
             raise ValueError(f"Template '{name}' not found. Available: {available}")
         return self.templates[name]
 
-    def list_templates(self) -> List[str]:
-        """Get list of available template names"""
-        return list(self.templates.keys())
+    def list_templates(self) -> Tuple[str, ...]:
+        """Names of the available templates (a shared, immutable tuple)"""
+        return self._names
 
     def describe_template(self, name: str) -> str:
         """Get description of a template"""
@@ -110,12 +184,17 @@ class PromptTemplates:
     def format_prompt(self, template_name: str, **kwargs) -> str:
         """Format a template with provided variables"""
         template = self.get_template(template_name)
-        try:
-            return template.template.format(**kwargs)
-        except KeyError as e:
+        missing = template._required - kwargs.keys()
+        if missing:
             raise ValueError(
-                f"Missing required variable for template '{template_name}': {e}"
+                f"Missing required variables for template '{template_name}': "
+                f"{', '.join(sorted(missing))}"
             )
+        return template.render(**kwargs)
+
+    def get_template_vars(self, template_name: str) -> FrozenSet[str]:
+        """Get the variable names a template expects"""
+        return self.get_template(template_name)._required
 
     def get_template_params(self, template_name: str) -> Dict[str, Any]:
         """Get default parameters for a template"""
@@ -124,13 +203,17 @@ class PromptTemplates:
 
 
 # Helper functions for easy access
+@functools.lru_cache(maxsize=1)
+def _default_templates() -> PromptTemplates:
+    """Shared collection for the helpers, built on first use"""
+    return PromptTemplates()
+
+
 def format_prompt(template_name: str, **kwargs) -> str:
     """Quick access to format a prompt template"""
-    templates = PromptTemplates()
-    return templates.format_prompt(template_name, **kwargs)
+    return _default_templates().format_prompt(template_name, **kwargs)
 
 
-def list_templates() -> List[str]:
+def list_templates() -> Tuple[str, ...]:
     """Quick access to list available templates"""
-    templates = PromptTemplates()
-    return templates.list_templates()
+    return _default_templates().list_templates()